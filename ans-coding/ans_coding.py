@@ -0,0 +1,183 @@
+import os
+import sys
+import numpy as np
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from container import container, write_container
+from timing import tracer, pop_trace_arg
+
+
+#   - Table of frequencies quantised so that they sum to 2^scale,
+#     every symbol occuring on array keeps a frequency >= 1
+class freqTable:
+    def __init__(self, arr = [], scale = 14):
+
+        self.array = arr
+
+        # Frequencies sum to 2^scale
+        self.scale = scale
+        self.total = 1 << scale
+
+        # - Quantised frequencies and cumulative frequencies,
+        #   arrays indexed by symbol (0..255)
+        self.freqs = np.zeros(256, dtype = np.uint64)
+        self.cums  = np.zeros(256, dtype = np.uint64)
+
+        # Slot table: slot (0..2^scale - 1) -> symbol
+        self.table = None
+
+    # Count symbols and quantise them into 2^scale
+    def make_freqs(self):
+        counts = np.bincount(np.asarray(self.array, dtype = np.uint8), minlength = 256)
+        symbols = np.flatnonzero(counts)
+
+        quantised = np.zeros(256, dtype = np.int64)
+        quantised[symbols] = np.maximum(1, np.round(counts[symbols] * self.total / counts.sum()))
+
+        # - Fix the sum to 2^scale, the error is given to (or taken
+        #   from) the most frequent symbols first
+        diff  = self.total - int(quantised.sum())
+        order = sorted(symbols.tolist(), key = lambda x: (-quantised[x], x))
+        if diff > 0:
+            quantised[order[0]] += diff
+        for symbol in order:
+            if diff >= 0:
+                break
+            take = min(-diff, int(quantised[symbol]) - 1)
+            quantised[symbol] -= take
+            diff += take
+
+        self.set_freqs({symbol: int(quantised[symbol]) for symbol in symbols.tolist()})
+
+    # set quantised frequencies {symbol: frequency}
+    def set_freqs(self, freqs):
+        self.freqs[:] = 0
+        for symbol, freq in freqs.items():
+            self.freqs[symbol] = freq
+        self.cums[1:] = np.cumsum(self.freqs)[:-1]
+        self.table = np.repeat(np.arange(256, dtype = np.uint8), self.freqs.astype(np.int64))
+
+    def get_freqs(self):
+        return {symbol: int(self.freqs[symbol]) for symbol in np.flatnonzero(self.freqs).tolist()}
+
+
+#   - rANS with interleaved states (lanes): symbol i goes to lane i % lanes,
+#     all lanes are coded at once with NumPy.
+#   - 32-bit states in [2^16, 2^32), renormalised 16 bits at a time,
+#     so each lane reads or writes at most one word per symbol.
+class ans:
+    def __init__(self, lanes, freq):
+
+        # number of interleaved states
+        self.lanes = lanes
+
+        # quantised frequency table
+        self.freq  = freq
+        self.scale = np.uint64(freq.scale)
+        self.mask  = np.uint64(freq.total - 1)
+
+        # lower bound of states
+        self.low = np.uint64(1 << 16)
+
+
+class encoder(ans):
+    def __init__(self, lanes, freq, bitout):
+        ans.__init__(self, lanes, freq)
+
+        # bitstream output
+        self.output = bitout
+
+    # - Encode the whole array, symbols are coded backward
+    #   (rANS is a stack), so decoder can read them forward
+    def encode(self, array):
+        array = np.asarray(array, dtype = np.uint8)
+
+        # Pad array with its last element to fill every lane
+        steps = -(-len(array) // self.lanes)
+        pad   = steps * self.lanes - len(array)
+        array = np.concatenate((array, np.full(pad, array[-1], dtype = np.uint8)))
+        array = array.reshape((steps, self.lanes))
+
+        freqs, cums = self.freq.freqs, self.freq.cums
+        bound = np.uint64(32) - self.scale
+
+        states = np.full(self.lanes, self.low, dtype = np.uint64)
+        words  = []
+        for step in range(steps - 1, -1, -1):
+            symbols = array[step]
+            f = freqs[symbols]
+
+            # Renormalise: lanes too large for this symbol push out 16 bits
+            full = states >= (f << bound)
+            if full.any():
+                words.append((states[full] & np.uint64(0xFFFF)).astype(np.uint16))
+                states[full] >>= np.uint64(16)
+
+            states = ((states // f) << self.scale) + states % f + cums[symbols]
+
+        # - Words are reversed so the decoder reads them forward,
+        #   final states go first
+        words = np.concatenate(words)[::-1] if words else np.zeros(0, dtype = np.uint16)
+        payload = states.astype('>u4').tobytes() + words.astype('>u2').tobytes()
+        self.output.write_bits(int.from_bytes(payload, 'big'), 8 * len(payload))
+
+    def finish(self):
+        self.output.close()
+
+
+class decoder(ans):
+    def __init__(self, lanes, freq, bitin):
+        ans.__init__(self, lanes, freq)
+
+        # encoded input
+        self.input = bitin
+
+        # array output
+        self.array = None
+
+    # - Decode "length" symbols, the slot (low bits of state)
+    #   gives the symbol directly through the slot table
+    def decode(self, length):
+        numbytes = self.input.remaining() // 8
+        payload  = self.input.read_bytes(numbytes)
+        states = np.frombuffer(payload[: 4 * self.lanes], dtype = '>u4').astype(np.uint64)
+        words  = np.frombuffer(payload[4 * self.lanes:], dtype = '>u2').astype(np.uint64)
+
+        freqs, cums, table = self.freq.freqs, self.freq.cums, self.freq.table
+
+        steps = -(-length // self.lanes)
+        array = np.empty((steps, self.lanes), dtype = np.uint8)
+        pos = 0
+        for step in range(steps):
+            slots   = states & self.mask
+            symbols = table[slots]
+            array[step] = symbols
+
+            states = freqs[symbols] * (states >> self.scale) + slots - cums[symbols]
+
+            # Renormalise: lanes below lower bound pull in 16 bits
+            empty = states < self.low
+            count = int(np.count_nonzero(empty))
+            if count:
+                states[empty] = (states[empty] << np.uint64(16)) | words[pos: pos + count][::-1]
+                pos += count
+
+        self.array = array.reshape(-1)[: length]
+        return self.array
+
+    def finish(self):
+        self.input.close()
+
+    def get_array(self):
+        return self.array
+
+
+# - Number of lanes for an array: a power of two giving
+#   about 2048 steps, between 32 and 16384 lanes
+def get_lanes(length):
+    lanes = 32
+    while lanes < 16384 and lanes * 2048 < length:
+        lanes *= 2
+    return lanes
@@ -0,0 +1,133 @@
+import os
+import cv2
+import time
+import numpy as np
+import sys
+
+import ans_coding
+
+class ans_compress:
+    def __init__(self, image_path, output_path):
+
+        self.image_path  = image_path
+        self.output_path = output_path
+
+        # Bitstream of encoded array (packed in memory)
+        self.bitout = None
+
+        # Image
+        self.image = None
+        # 1D array create from image
+        self.array = None
+
+        # Quantised frequencies of array symbols
+        self.freqs = None
+        # Frequencies sum to 2^scale
+        self.scale = None
+        # Number of interleaved rANS states
+        self.lanes = None
+
+        # Number of bits use for image
+        self.numbits_input = 0
+        # Number of bits output on compression
+        self.numbits_output = 0
+        # Ratio of image (bits in / bits out)
+        self.ratio = 0
+        
+        # Time processing
+        self.time = time.time()
+
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = ans_coding.tracer()
+
+        self.read()
+        self.toarray()
+
+    def read(self):
+        with self.trace.span("read"):
+            try:
+                self.image = cv2.imread(self.image_path)
+                w, h, c = self.image.shape
+                self.numbits_input = w * h * c * 8
+            except:
+                raise Exception("Image Invalid")
+    
+    # convert image into 1D array
+    def toarray(self):
+        w, h, c = self.image.shape
+        with self.trace.span("color"):
+            YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
+        with self.trace.span("flatten"):
+            Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
+
+            Y_array  = Y.reshape((1, w * h))[0]
+            Cr_array = Cr.reshape((1, w * h))[0]
+            Cb_array = Cb.reshape((1, w * h))[0]
+
+            self.array = np.concatenate((Y_array, Cr_array, Cb_array), axis = 0)
+
+    def compress(self):
+
+        with self.trace.span("model"):
+            # Set up quantised frequencies of array
+            freq_table = ans_coding.freqTable(self.array)
+            freq_table.make_freqs()
+            self.freqs = freq_table.get_freqs()
+            self.scale = freq_table.scale
+
+        with self.trace.span("encode"):
+            # Set up bitout stream
+            self.bitout = ans_coding.bitOutStream()
+
+            self.lanes = ans_coding.get_lanes(len(self.array))
+            encoder = ans_coding.encoder(self.lanes, freq_table, self.bitout)
+
+            # encode the whole array at once
+            encoder.encode(self.array)
+            encoder.finish()
+
+        self.numbits_output = len(self.bitout) + (8 + self.scale + 1) * len(self.freqs)
+        self.ratio = 1.0 * self.numbits_input / self.numbits_output
+
+    # write to byte output
+    def write(self):
+        with self.trace.span("serialise"):
+            header = ans_coding.bitOutStream()
+
+            # shape (w and h) is saved on the container header
+            w, h, c  = self.image.shape
+
+            # - Write number of lanes, as a power of 2 (5bits)
+            header.write_bits(self.lanes.bit_length() - 1, 5)
+
+            # - Write the quantised frequencies: scale (5bits),
+            #   length of freqs (9bits), then:
+            #   key(8bits) + freq(scale + 1 bits) + ...
+            header.write_bits(self.scale, 5)
+            header.write_bits(len(self.freqs), 9)
+            for key, freq in self.freqs.items():
+                header.write_bits(key, 8)
+                header.write_bits(freq, self.scale + 1)
+
+        # - Save the container: fixed header (with shape),
+        #   header above as the model section, encoded array as payload
+        with self.trace.span("write"):
+            ans_coding.write_container(self.output_path, "ans", (w, h), header, self.bitout)
+
+        self.time = time.time() - self.time
+        print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
+
+
+def main(argv):
+    argv, trace_path = ans_coding.pop_trace_arg(argv)
+    image_path, output_path = argv
+
+    compressor = ans_compress(image_path, output_path)
+    compressor.compress()
+    compressor.write()
+    if trace_path:
+        compressor.trace.dump(trace_path, codec = "ans", mode = "compress", input = argv[0], output = argv[1])
+    return compressor
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
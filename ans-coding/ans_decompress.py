@@ -0,0 +1,122 @@
+import os
+import cv2
+import sys
+import time
+import numpy as np
+import ans_coding
+
+class ans_decompress:
+    def __init__(self, encoded_path, image_output_path):
+
+        self.input_path  = encoded_path
+        self.output_path = image_output_path
+
+        # bitstream of encoded array
+        self.bitin = None
+
+        # container of the compressed file (memory mapped)
+        self.file = None
+
+        # Image output and shape (w, h)
+        self.image = None
+        self.w = None
+        self.h = None
+
+        # 1D array
+        self.array = None
+
+        # Quantised frequencies and their scale (sum is 2^scale)
+        self.freqs = {}
+        self.scale = None
+        # Number of interleaved rANS states
+        self.lanes = None
+
+        # Time processing
+        self.time = time.time()
+
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = ans_coding.tracer()
+
+        self.read()
+
+    # Read from compressed file 
+    def read(self):
+
+        with self.trace.span("read"):
+            # Open the container (memory mapped), shape is on its header
+            self.file = ans_coding.container(self.input_path, codec = "ans")
+            self.w, self.h = self.file.shape
+
+            # Model section: codec parameters and tables
+            self.bitin = self.file.model()
+
+        with self.trace.span("model"):
+            # Read number of lanes
+            self.lanes = 1 << self.bitin.read_bits(5)
+
+            # Read quantised frequencies
+            self.scale = self.bitin.read_bits(5)
+            leng_freqs = self.bitin.read_bits(9)
+            for _ in range(leng_freqs):
+                key = self.bitin.read_bits(8)
+                self.freqs[key] = self.bitin.read_bits(self.scale + 1)
+
+        # encoded array, the payload of container
+        self.bitin = self.file.payload()
+
+    # Covert 1D array into image
+    def toimage(self):
+        w, h = self.w, self.h
+
+        # Subtract 1D array into 3 sub arrays
+        with self.trace.span("reshape"):
+            Y_array  = self.array[: w*h]
+            Cr_array = self.array[w*h : 2*w*h]
+            Cb_array = self.array[2*w*h : 3*w*h]
+
+            # convert array into 3 channels image
+            Y  = Y_array.reshape((w,h))
+            Cr = Cr_array.reshape((w,h))
+            Cb = Cb_array.reshape((w,h))
+
+            # Create a copy zero image
+            image = np.zeros((w,h,3), dtype = np.uint8)
+            image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
+
+        # Convert to RGB
+        with self.trace.span("color"):
+            self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
+
+    def decompress(self):
+        with self.trace.span("model"):
+            # Create quantised frequency table
+            freq_table = ans_coding.freqTable(scale = self.scale)
+            freq_table.set_freqs(self.freqs)
+
+        with self.trace.span("decode"):
+            decoder = ans_coding.decoder(self.lanes, freq_table, self.bitin)
+            decoder.decode(self.w * self.h * 3)
+            decoder.finish()
+
+            self.array = decoder.get_array()
+        self.toimage()
+
+    def write(self):
+        with self.trace.span("write"):
+            cv2.imwrite(self.output_path, self.image)
+        self.time = time.time() - self.time
+        print("Input: \'%s\' \tOutput: \'%s\' \tTime: %.2f(s)"%(self.input_path, self.output_path, self.time))
+
+
+def main(argv):
+    argv, trace_path = ans_coding.pop_trace_arg(argv)
+    input_path, image_path = argv
+
+    decompressor = ans_decompress(input_path, image_path)
+    decompressor.decompress()
+    decompressor.write()
+    if trace_path:
+        decompressor.trace.dump(trace_path, codec = "ans", mode = "decompress", input = argv[0], output = argv[1])
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
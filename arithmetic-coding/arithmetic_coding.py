@@ -1,4 +1,17 @@
 import os
+import sys
+import bisect
+import numpy as np
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from timing import tracer, pop_trace_arg
+from frequencies import first_occurrence
+
+# - Coder backends and models, the index is saved on compressed file,
+#   names are on ../common/container.py
+from container import container, write_container, coders, models
 
 class arithmetic:
     
@@ -37,8 +50,7 @@ class encoder(arithmetic):
     def encode(self, freq, symbol):
         
         total   = freq.get_total()
-        symlow  = freq.get_low(symbol)
-        symhigh = freq.get_high(symbol)
+        symlow, symhigh = freq.get_range(symbol)
         _range   = self.high - self.low + 1
         
         self.high = self.low + symhigh * _range // total - 1
@@ -64,16 +76,17 @@ class encoder(arithmetic):
             self.low  = ((self.low  << 2) & self.mask) >> 1
             self.high = (((self.high << 2) & self.mask) >> 1) | self.max_range | 1
     
-    # write bit into a file for speeding
+    # write bit and pending bits (the opposite one) to bitout
     def write(self, bit):
-        self.output.write(bit)
-        for _ in range(self.pending_bits):
-            self.output.write(1 ^ bit)
+        self.output.write_bit(bit)
+        if self.pending_bits > 0:
+            pending = 0 if bit else (1 << self.pending_bits) - 1
+            self.output.write_bits(pending, self.pending_bits)
         self.pending_bits = 0
     
     # finish encoding
     def finish(self):
-        self.output.write(1)
+        self.output.write_bit(1)
         self.output.close()
 
 
@@ -90,9 +103,8 @@ class decoder(arithmetic):
         for _ in range(self.numbits):
             self.code = (self.code << 1) | self.read()
         
-        # array output
-        # It could be faster if we write to file
-        self.array = []
+        # array output, one byte for each symbol
+        self.array = bytearray()
 
 
     def decode(self, freq):
@@ -108,8 +120,7 @@ class decoder(arithmetic):
         
         self.array.append(symbol)
         
-        symlow  = freq.get_low(symbol)
-        symhigh = freq.get_high(symbol)
+        symlow, symhigh = freq.get_range(symbol)
 
         self.high = self.low + symhigh * _range // total - 1
         self.low  = self.low + symlow  * _range // total
@@ -133,8 +144,11 @@ class decoder(arithmetic):
         
         return symbol
 
+    # read a bit, "0" is read after the end of bitstream
     def read(self):
         bit = self.input.read()
+        if bit == None:
+            bit = 0
         return bit
 
     def finish(self):
@@ -142,6 +156,114 @@ class decoder(arithmetic):
 
 
 
+#   - Range coder (carry-less, Subbotin style): same model as arithmetic
+#     coding, but low and range are renormalised a byte at a time,
+#     so there is ~8x less loop iterations per symbol
+#   - 64 bits low/range, totals of frequencies must be lower than bottom
+class rangeCoder:
+
+    def __init__(self):
+        self.numbits = 64
+        self.mask    = (1 << 64) - 1
+
+        # Renormalise when top byte of low and low + range are equal
+        self.top    = 1 << 56
+        # Range never goes below bottom
+        self.bottom = 1 << 48
+
+        self.low   = 0
+        self.range = self.mask
+
+
+class rangeEncoder(rangeCoder):
+    def __init__(self, bitout):
+        rangeCoder.__init__(self)
+
+        # bitstream output, bytes are kept on buffer until finishing
+        self.output = bitout
+        self.buffer = bytearray()
+
+    def encode(self, freq, symbol):
+        symlow, symhigh = freq.get_range(symbol)
+
+        self.range //= freq.get_total()
+        self.low    += symlow * self.range
+        self.range  *= symhigh - symlow
+
+        # - Output the top byte while it is settled, or when range
+        #   is too small (range is cut so that no carry can happen)
+        while True:
+            if (self.low ^ (self.low + self.range)) >= self.top:
+                if self.range >= self.bottom:
+                    break
+                self.range = -self.low & (self.bottom - 1)
+            self.buffer.append(self.low >> 56)
+            self.low   = (self.low << 8) & self.mask
+            self.range = (self.range << 8) & self.mask
+
+    # finish encoding, flush all bytes of low
+    def finish(self):
+        self.buffer += self.low.to_bytes(8, 'big')
+        self.output.write_bits(int.from_bytes(self.buffer, 'big'), 8 * len(self.buffer))
+        self.output.close()
+
+
+class rangeDecoder(rangeCoder):
+    def __init__(self, bitin):
+        rangeCoder.__init__(self)
+
+        # encoded input, read as bytes
+        self.input = bitin
+        numbytes   = bitin.remaining() // 8
+        self.data  = bitin.read_bytes(numbytes)
+        self.index = 0
+
+        # a code to get symbol
+        self.code = 0
+        for _ in range(8):
+            self.code = (self.code << 8) | self.read()
+
+        # array output, one byte for each symbol
+        self.array = bytearray()
+
+    def decode(self, freq):
+        total = freq.get_total()
+        self.range //= total
+        value  = min((self.code - self.low) // self.range, total - 1)
+        symbol = freq.get_symbol(value)
+
+        if symbol == 256:
+            return symbol
+
+        self.array.append(symbol)
+
+        symlow, symhigh = freq.get_range(symbol)
+        self.low   += symlow * self.range
+        self.range *= symhigh - symlow
+
+        while True:
+            if (self.low ^ (self.low + self.range)) >= self.top:
+                if self.range >= self.bottom:
+                    break
+                self.range = -self.low & (self.bottom - 1)
+            self.code  = ((self.code << 8) & self.mask) | self.read()
+            self.low   = (self.low << 8) & self.mask
+            self.range = (self.range << 8) & self.mask
+
+        return symbol
+
+    # read a byte, "0" is read after the end of input
+    def read(self):
+        if self.index >= len(self.data):
+            return 0
+        byte = self.data[self.index]
+        self.index += 1
+        return byte
+
+    def finish(self):
+        self.input.close()
+
+
 #   - Table holding frequency of each element in an "Array"
 #   - It directly creates Range for each symbol if it has "Array"
 #     or frequencies of elements.
@@ -149,7 +271,7 @@ class freqTable:
     def __init__(self, arr = [], freq_dict = {}):
         
         # Array and length of Array
-        self.arr   = list(arr)
+        self.arr   = arr
         self.total = 0
 
         #   - Dictionary of frequencies and Range of symbols
@@ -158,9 +280,22 @@ class freqTable:
         self.symbol_range = {}
         self.symnum       = len(freq_dict)
 
+        #   - Symbols and their cumulative lows (sorted, in order of freq_dict)
+        #     for binary search of a value
+        self.symbols = []
+        self.lows    = []
+
+        #   - Direct table value -> symbol, only made when
+        #     total is small enough (<= max_table)
+        self.max_table = 1 << 16
+        self.table     = None
+
     
     # make range of symbols 
     def _make_symbol_range(self):
+        self.symbol_range = {}
+        self.symbols = []
+        self.lows    = []
         if len(self.freq_dict) > 0:
             _sum = 0
             for symbol in self.freq_dict.keys():
@@ -168,6 +303,15 @@ class freqTable:
                 high = _sum + self.freq_dict[symbol]
                 _sum = high
                 self.symbol_range[symbol] = (low, high)
+                self.symbols.append(symbol)
+                self.lows.append(low)
+
+        self.table = None
+        if self.total <= self.max_table:
+            self.table = []
+            for symbol in self.symbols:
+                low, high = self.symbol_range[symbol]
+                self.table.extend([symbol] * (high - low))
 
     def set_freq_dict(self, freq_dict):
         self.freq_dict = freq_dict
@@ -175,16 +319,19 @@ class freqTable:
         self.total     = sum(freq_dict.values())
         self._make_symbol_range()
 
+    # - Count frequencies of a uint8 array at once (np.bincount),
+    #   symbols are kept in order of their first occurrence,
+    #   then eof (256) once at the end
     def set_array(self, arr):
-        self.arr   = list(arr)
-        self.total = len(arr)
+        self.arr   = arr
+        self.total = len(arr) + 1
         # make dictionary of frequencies
+        counts = np.bincount(arr, minlength = 256)
+        first  = first_occurrence(arr, np.count_nonzero(counts))
         self.freq_dict = {}
-        for key in arr:
-            if key in self.freq_dict:
-                self.freq_dict[key] += 1
-            else:
-                self.freq_dict[key] = 1
+        for key in sorted(first, key = first.get):
+            self.freq_dict[key] = int(counts[key])
+        self.freq_dict[256] = 1
 
         self.symnum = len(self.freq_dict)
         self._make_symbol_range()
@@ -199,62 +346,138 @@ class freqTable:
     def get_high(self, symbol):
         if symbol in self.freq_dict:
             return self.symbol_range[symbol][1]
+
+    def get_range(self, symbol):
+        return self.symbol_range[symbol]
     
-    # get symbol depend on value (binary seach)
+    # - Get symbol depend on value, by the direct table,
+    #   or binary search on cumulative lows
     def get_symbol(self, value):
-        left  = 0
-        right = self.symnum - 1
-        
-        while left <= right:
-            middle = (left + right) // 2
-            symbol = list(self.freq_dict.keys())[middle]
-            
-            low, high = self.symbol_range[symbol]
-            if value < low:
-                right = middle - 1
-            elif value >= high:
-                left = middle + 1
-            else:
-                return symbol
-
-
-# writing output to a temp file
-class bitOutStream:
-
-    def __init__(self, stringpath):
-        
-        if os.path.exists(stringpath):
-            os.remove(stringpath)
+        if self.table is not None:
+            return self.table[value]
+        return self.symbols[bisect.bisect_right(self.lows, value) - 1]
 
-        self.stringpath = stringpath
-        
-        self.stringout = open(stringpath, 'a+')
 
-    # append bit into string file
-    def write(self, bit):
-        self.stringout.write(str(bit))
-    
-    # terminate writing
-    def close(self):
-        self.stringout.close()
+#   - Adaptive frequency table, frequencies are kept on a Fenwick
+#     (binary indexed) tree, so updating a frequency and getting a
+#     cumulative frequency both take O(log n)
+#   - Same interface as freqTable for encoder / decoder
+class fenwickTable:
+    def __init__(self, symnum = 257, increment = 24, limit = 1 << 16):
 
-# reading input bitstream
-class bitInStream:
+        # Number of symbols (0..255 and eof 256)
+        self.symnum = symnum
 
-    def __init__(self, stringpath):
-        
-        assert os.path.exists(stringpath)
+        # Added to frequency of a symbol each time it is coded
+        self.increment = increment
 
-        self.stringpath = stringpath
-        self.stringin = open(stringpath, 'r')
-    
-    def read(self):
-        bit = self.stringin.read(1)
-        if bit == '':
-            bit = 0
-        return int(bit)
-    
-    def close(self):
-        self.stringin.close()
+        # Frequencies are halved when total exceeds limit
+        self.limit = limit
 
+        # Frequencies (every symbol starts with 1) and the tree
+        self.freqs = [1] * symnum
+        self.tree  = [0] * (symnum + 1)
+        self.total = 0
 
+        # Highest power of 2 <= symnum, first step of searching
+        self.step = 1 << (symnum.bit_length() - 1)
+
+        self._make_tree()
+
+    # build the tree from frequencies in O(n)
+    def _make_tree(self):
+        self.tree = [0] + self.freqs
+        for i in range(1, self.symnum + 1):
+            parent = i + (i & -i)
+            if parent <= self.symnum:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.freqs)
+
+    def get_total(self):
+        return self.total
+
+    # sum of frequencies of symbols lower than symbol
+    def get_low(self, symbol):
+        low = 0
+        i = int(symbol)
+        while i > 0:
+            low += self.tree[i]
+            i -= i & -i
+        return low
+
+    def get_high(self, symbol):
+        return self.get_low(symbol) + self.freqs[symbol]
+
+    def get_range(self, symbol):
+        low = self.get_low(symbol)
+        return low, low + self.freqs[symbol]
+
+    # symbol whose range contains value, by walking down the tree
+    def get_symbol(self, value):
+        pos  = 0
+        step = self.step
+        while step:
+            nxt = pos + step
+            if nxt <= self.symnum and self.tree[nxt] <= value:
+                pos = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+    # add increment to frequency of symbol
+    def update(self, symbol):
+        self.freqs[symbol] += self.increment
+        self.total += self.increment
+        i = int(symbol) + 1
+        while i <= self.symnum:
+            self.tree[i] += self.increment
+            i += i & -i
+
+        if self.total > self.limit:
+            self.freqs = [(freq + 1) // 2 for freq in self.freqs]
+            self._make_tree()
+
+
+#   - Set of adaptive tables, the table for the next symbol is chosen
+#     by context: the channel of symbol and / or previous symbol
+class adaptiveModel:
+    def __init__(self, model, plane_size):
+
+        # model name (one of models, except "static")
+        self.model = model
+
+        # Number of symbols on each channel
+        self.plane_size = plane_size
+
+        # Number of tables
+        if model == "adaptive":
+            num_tables = 1
+        elif model == "channel":
+            num_tables = 3
+        else:
+            num_tables = 3 * 8
+        self.tables = [fenwickTable() for _ in range(num_tables)]
+
+        # index and value of previous symbol
+        self.index    = 0
+        self.previous = 0
+
+        self.table = self.tables[0]
+
+    # get table for the next symbol
+    def get_table(self):
+        return self.table
+
+    # update table by symbol coded, then choose the next table
+    def update(self, symbol):
+        self.table.update(symbol)
+        self.index   += 1
+        self.previous = symbol
+
+        if self.model == "adaptive":
+            return
+        channel = min(self.index // self.plane_size, 2)
+        if self.model == "channel":
+            self.table = self.tables[channel]
+        else:
+            self.table = self.tables[channel * 8 + ((self.previous >> 5) & 7)]
@@ -1,20 +1,31 @@
 import os
 import sys
 import cv2
-import pickle
 import time
 
 import numpy as np
-from arithmetic_coding import encoder, freqTable, bitOutStream
+from arithmetic_coding import encoder, rangeEncoder, freqTable, adaptiveModel, bitOutStream, write_container, tracer, pop_trace_arg, coders, models
 
 class arithmetic_compress:
-    def __init__(self, image_path, output_path):
+    def __init__(self, image_path, output_path, coder = "arithmetic", model = "static"):
         # image path
         self.image_path  = image_path
         # compressed path
         self.output_path = output_path
-        # string output path (string before changed to bytearray)
-        self.string_path = "encoded_string"
+        # bitstream output (bits before changed to bytearray)
+        self.bitout = None
+
+        # - Coder backend: "arithmetic" (bit renormalisation)
+        #   or "range" (byte renormalisation)
+        if coder not in coders:
+            raise ValueError("Coder must be one of %s" % ", ".join(coders))
+        self.coder = coder
+
+        # - Model: "static" (frequencies counted first and saved),
+        #   or adaptive ones with contexts ("adaptive", "channel", "previous")
+        if model not in models:
+            raise ValueError("Model must be one of %s" % ", ".join(models))
+        self.model = model
 
         # image
         self.image = None
@@ -35,134 +46,145 @@ class arithmetic_compress:
         # time using for compressing
         self.time = time.time()
 
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = tracer()
+
         self.read()
         self.toarray()
 
     # read image from image_path and compute bits input
     def read(self):
-        try:
-            self.image = cv2.imread(self.image_path)
-            w, h, c = self.image.shape
-            self.numbits_input = w * h * c * 8
-        except:
-            raise Exception("Image Invalid")
+        with self.trace.span("read"):
+            try:
+                self.image = cv2.imread(self.image_path)
+                w, h, c = self.image.shape
+                self.numbits_input = w * h * c * 8
+            except:
+                raise Exception("Image Invalid")
     
     # convert image into 1d-array
     def toarray(self):
-        YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
+        with self.trace.span("color"):
+            YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
         
-        Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
-        
-        w, h, _c = self.image.shape
-        Y  = Y.reshape((1, w*h))[0]
-        Cr = Cr.reshape((1, w*h))[0]
-        Cb = Cb.reshape((1, w*h))[0]
+        with self.trace.span("flatten"):
+            Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
 
-        self.array = list(np.concatenate((Y, Cr, Cb), axis = 0))
+            w, h, _c = self.image.shape
+            Y  = Y.reshape((1, w*h))[0]
+            Cr = Cr.reshape((1, w*h))[0]
+            Cb = Cb.reshape((1, w*h))[0]
 
-    def compress(self, numbits):
-        
-        # push eof into array
-        self.array.append(256)
-
-        # set up frequencies table
-        freq = freqTable()
-        freq.set_array(self.array)
-        self.freq = freq.freq_dict
+            self.array = np.concatenate((Y, Cr, Cb), axis = 0)
 
-        # set up bit string output
-        bitout = bitOutStream(self.string_path)
-
-        model  = encoder(numbits = numbits, bitout = bitout)
+    def compress(self, numbits):
         
-        # Encode each elements in array image
-        # and save it into string_path
-        leng_array = len(self.array)
-        t = leng_array * 1.0 / 100
-        percent = 0
-        for i,elem in enumerate(self.array):
-            if i * 100.0/ leng_array > percent:
-                percent += 1
-                sys.stdout.write("Processing:\t{} %\r".format(percent))
-                sys.stdout.flush()
-            model.encode(freq, elem)
-        model.finish()
+        with self.trace.span("model"):
+            # - Set up frequencies table, static one is counted on array
+            #   (with eof 256 once at the end),
+            #   adaptive ones are updated after each symbol
+            if self.model == "static":
+                freq = freqTable()
+                freq.set_array(self.array)
+                self.freq = freq.freq_dict
+            else:
+                w, h, _ = self.image.shape
+                contexts = adaptiveModel(self.model, w * h)
+
+        with self.trace.span("encode"):
+            # set up bit string output
+            self.bitout = bitOutStream()
+
+            if self.coder == "range":
+                model = rangeEncoder(bitout = self.bitout)
+            else:
+                model = encoder(numbits = numbits, bitout = self.bitout)
+
+            # - Encode each elements in array image, then eof,
+            #   and save it into bitout. A memoryview of the uint8
+            #   array gives python ints without a list of all symbols
+            leng_array = len(self.array) + 1
+            percent = 0
+            for i,elem in enumerate(memoryview(self.array)):
+                if i * 100.0/ leng_array > percent:
+                    percent += 1
+                    sys.stdout.write("Processing:\t{} %\r".format(percent))
+                    sys.stdout.flush()
+                if self.model == "static":
+                    model.encode(freq, elem)
+                else:
+                    model.encode(contexts.get_table(), elem)
+                    contexts.update(elem)
+            if self.model == "static":
+                model.encode(freq, 256)
+            else:
+                model.encode(contexts.get_table(), 256)
+            model.finish()
         print('')
         
         self.get_total_bitout()
         
     def get_total_bitout(self):
-        # bit use for dictionary
-        self.numbits_output = 256 * 8 * 2
+        # bit use for dictionary (no dictionary on adaptive models)
+        self.numbits_output = 256 * 8 * 2 if self.model == "static" else 0
 
         # bit use for encoded file
-        with open(self.string_path, 'r') as f:
-            encoded = f.read()
-            self.numbits_output += len(encoded)
+        self.numbits_output += len(self.bitout)
         
         self.ratio = self.numbits_input * 1.0 / self.numbits_output
     
     # write to bytes output
     def write(self):
-        # Save the w, h (shape of image) into bitstring
-        # It has structure: length_shape (8bits) + value (length_shape bits)
-        shape_str = ""
-        w, h, _ = self.image.shape
-        wstring = '{:b}'.format(w)
-        hstring = '{:b}'.format(h)
-        wlength = '{:05b}'.format(len(wstring))
-        hlength = '{:05b}'.format(len(hstring))
-        shape_str = wlength + wstring + hlength + hstring
-
-        # pop the eof out of dictionary
-        if 256 in self.freq:
-            self.freq.pop(256)
-
-        dict_str = ""
-        # The first is length of dictionary
-        dict_str += '{:09b}'.format(len(self.freq))
-
-        # Dictionary is save as "key" + "length_frequency" + "frequency"
-        # "key" : 8 bits
-        # "length_frequency" : 5 bits
-        # "frequency" : length_frequency bits
-        for key, frequency in self.freq.items():    
-            str_frequency = '{:b}'.format(frequency)
-            length_frequency = '{:05b}'.format(len(str_frequency))
-            dict_str += '{:08b}'.format(key) + length_frequency + str_frequency
-        
-        # read encoded array
-        with open(self.string_path, 'r') as f:
-            encoded_array = f.read()
-        
-        # combine shapestr, dictstr and encoded array
-        encoded_text = shape_str + dict_str + encoded_array
-        
-        # add some zero into encoded_text to make sure they can save as byte array
-        leng = len(encoded_text)
-        num_zero = 8  - leng % 8
+        with self.trace.span("serialise"):
+            header = bitOutStream()
+
+            # the w, h (shape of image) is saved on the container header
+            w, h, _ = self.image.shape
+
+            # Save the coder backend (8bits) and model (8bits)
+            header.write_bits(coders.index(self.coder), 8)
+            header.write_bits(models.index(self.model), 8)
+
+            # Dictionary of frequencies, only static model has it
+            if self.model == "static":
+                # pop the eof out of dictionary
+                if 256 in self.freq:
+                    self.freq.pop(256)
+
+                # The first is length of dictionary
+                header.write_bits(len(self.freq), 9)
+
+                # Dictionary is save as "key" + "length_frequency" + "frequency"
+                # "key" : 8 bits
+                # "length_frequency" : 5 bits
+                # "frequency" : length_frequency bits
+                for key, frequency in self.freq.items():    
+                    header.write_bits(int(key), 8)
+                    header.write_bits(frequency.bit_length(), 5)
+                    header.write_bits(frequency, frequency.bit_length())
 
-        encoded_text += '{:08b}'.format(num_zero)
-        encoded_text  = '0' * num_zero + encoded_text
-        # extract every 8 bits and save them as an item into bytearray
-        b = bytearray()
-        for i in range(0, leng + num_zero + 8, 8):
-            b.append(int(encoded_text[i: i + 8], 2))
+        # - Save the container: fixed header (with shape),
+        #   header above as the model section, encoded array as payload
+        with self.trace.span("write"):
+            write_container(self.output_path, "arithmetic", (w, h), header, self.bitout)
 
-        # save byte array to output
-        with open(self.output_path, 'wb') as f:
-            pickle.dump(b, f)
-            self.time = time.time() - self.time
-            print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
+        self.time = time.time() - self.time
+        print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
 
 
 def main(argv):
+    argv, trace_path = pop_trace_arg(argv)
 
-    images, output = argv
+    images, output = argv[:2]
+    coder = argv[2] if len(argv) > 2 else "arithmetic"
+    model = argv[3] if len(argv) > 3 else "static"
     
-    compressor = arithmetic_compress(images, output)
+    compressor = arithmetic_compress(images, output, coder, model)
     compressor.compress(numbits = 32)
     compressor.write()
+    if trace_path:
+        compressor.trace.dump(trace_path, codec = "arithmetic", mode = "compress", input = argv[0], output = argv[1])
+    return compressor
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -1,11 +1,10 @@
 import os
 import sys
 import cv2
-import pickle
 import time
 
 import numpy as np
-from arithmetic_coding import decoder, freqTable, bitInStream
+from arithmetic_coding import decoder, rangeDecoder, freqTable, adaptiveModel, container, tracer, pop_trace_arg, coders, models
 
 class arithmetic_decompress:
     def __init__(self, encoded_path, image_output_path):
@@ -16,8 +15,17 @@ class arithmetic_decompress:
         # output path
         self.output_path = image_output_path
 
-        # encoded array path (keep as file for faster memory)
-        self.string_path  = "encoded_string"
+        # bitstream of encoded array
+        self.bitin = None
+
+        # container of the compressed file (memory mapped)
+        self.file = None
+
+        # coder backend ("arithmetic" or "range")
+        self.coder = None
+
+        # model ("static" or adaptive ones)
+        self.model = None
         
         # dictionary of frequencies
         self.freq_dict = {}
@@ -32,6 +40,9 @@ class arithmetic_decompress:
         # time processing
         self.time = time.time()
 
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = tracer()
+
         self.read()
 
 
@@ -39,44 +50,35 @@ class arithmetic_decompress:
     # Read from an encoded byte file,
     # Extract them into dict and encoded array
     def read(self):
-        encoded_text = ""
-        with open(self.encoded_path, 'rb') as f:
-            byte_array = pickle.load(f)
-        for byte in byte_array:
-            encoded_text += '{:08b}'.format(byte)
-        
-        # extract some "0" at the first
-        num_zero = int(encoded_text[-8:],2)
-        encoded_text = encoded_text[num_zero: -8]
-        
-        # get the image's shape
-        wlength = int(encoded_text[:5], 2)
-        hlength = int(encoded_text[5 + wlength: 10 + wlength], 2)
-        w = int(encoded_text[5: 5 + wlength], 2)
-        h = int(encoded_text[10 + wlength: 10 + wlength + hlength], 2)
-        self.shape = (w,h)
-        encoded_text = encoded_text[10 + wlength + hlength : ]
-
-        # get length dictionary
-        length_dict = int(encoded_text[:9], 2)
-        encoded_text = encoded_text[9:]
-        
-        # Reconstruct dictionary frequencies
-        # key(8bits) + length frequency (5bits) + frequency
-        i = 0
-        for _ in range(length_dict):
-            key         = int(encoded_text[i: i + 8], 2)
-            length_freq = int(encoded_text[i + 8: i + 13], 2)
-            freq        = int(encoded_text[i + 13: i + 13 + length_freq], 2)
-            
-            self.freq_dict[key] = freq
-
-            i = i + 13 + length_freq
-        
-        # extract and save encoded array into string path
-        encoded_array = encoded_text[i:]
-        with open(self.string_path, 'w') as f:
-            f.write(encoded_array)
+        with self.trace.span("read"):
+            # open the container (memory mapped), shape is on its header
+            self.file = container(self.encoded_path, codec = "arithmetic")
+            self.shape = self.file.shape
+
+            # model section: coder, model and frequencies
+            self.bitin = self.file.model()
+
+        with self.trace.span("model"):
+            # get the coder backend and model
+            self.coder = coders[self.bitin.read_bits(8)]
+            self.model = models[self.bitin.read_bits(8)]
+
+            # Dictionary of frequencies, only static model has it
+            if self.model == "static":
+                # get length dictionary
+                length_dict = self.bitin.read_bits(9)
+
+                # Reconstruct dictionary frequencies
+                # key(8bits) + length frequency (5bits) + frequency
+                for _ in range(length_dict):
+                    key         = self.bitin.read_bits(8)
+                    length_freq = self.bitin.read_bits(5)
+                    freq        = self.bitin.read_bits(length_freq)
+
+                    self.freq_dict[key] = freq
+
+        # encoded array, the payload of container
+        self.bitin = self.file.payload()
 
     # conver 1d-array to image
     def toimage(self):
@@ -85,67 +87,85 @@ class arithmetic_decompress:
         s = w * h
 
         # extract into 3 sub arrays
-        Y_array  = np.array(self.array[ : s])
-        Cr_array = np.array(self.array[s: 2*s])
-        Cb_array = np.array(self.array[2*s : 3*s])
+        with self.trace.span("reshape"):
+            Y_array  = self.array[ : s]
+            Cr_array = self.array[s: 2*s]
+            Cb_array = self.array[2*s : 3*s]
 
-        # reshape into image channels
-        Y  = Y_array.reshape(self.shape) 
-        Cr = Cr_array.reshape(self.shape)
-        Cb = Cb_array.reshape(self.shape)
+            # reshape into image channels
+            Y  = Y_array.reshape(self.shape) 
+            Cr = Cr_array.reshape(self.shape)
+            Cb = Cb_array.reshape(self.shape)
 
-        # create a image
-        image = np.zeros((w,h,3), dtype = np.uint8)
-        image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
+            # create a image
+            image = np.zeros((w,h,3), dtype = np.uint8)
+            image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
 
         # convert to RGB color space
-        self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
+        with self.trace.span("color"):
+            self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
 
 
     def decompress(self, numbits):
 
-        # push eof into dict
-        if 256 not in self.freq_dict:
-            self.freq_dict[256] = 1
-
-        freq = freqTable()
-        freq.set_freq_dict(self.freq_dict)
-        total = freq.get_total()
-
-        # set up bitin
-        bitin = bitInStream(self.string_path)
-        
-        # set up decoder
-        model = decoder(numbits = 32, bitin = bitin)
-        
-        i = 0
-        percent = 0
-        while True:
-            if i * 100.0 / total > percent:
-                percent += 1
-                sys.stdout.write("Processing:\t{} %\r".format(percent))
-                sys.stdout.flush()
-
-            i += 1
-            symbol = model.decode(freq)
-            if symbol == 256:
-                break
-        print('')
-        model.finish()
-        self.array = model.array
+        with self.trace.span("model"):
+            # - Set up frequencies table, static one from dictionary,
+            #   adaptive ones are updated after each symbol
+            w, h = self.shape
+            if self.model == "static":
+                # push eof into dict
+                if 256 not in self.freq_dict:
+                    self.freq_dict[256] = 1
+
+                freq = freqTable()
+                freq.set_freq_dict(self.freq_dict)
+            else:
+                contexts = adaptiveModel(self.model, w * h)
+            total = w * h * 3 + 1
+
+        with self.trace.span("decode"):
+            # set up decoder
+            if self.coder == "range":
+                model = rangeDecoder(bitin = self.bitin)
+            else:
+                model = decoder(numbits = numbits, bitin = self.bitin)
+
+            i = 0
+            percent = 0
+            while True:
+                if i * 100.0 / total > percent:
+                    percent += 1
+                    sys.stdout.write("Processing:\t{} %\r".format(percent))
+                    sys.stdout.flush()
+
+                i += 1
+                if self.model == "static":
+                    symbol = model.decode(freq)
+                else:
+                    symbol = model.decode(contexts.get_table())
+                    contexts.update(symbol)
+                if symbol == 256:
+                    break
+            print('')
+            model.finish()
+            self.array = np.frombuffer(model.array, dtype = np.uint8)
         self.toimage()
 
     def write(self):
-        cv2.imwrite(self.output_path, self.image)
+        with self.trace.span("write"):
+            cv2.imwrite(self.output_path, self.image)
         self.time = time.time() - self.time
         print("Input: \'%s\' \tOutput: \'%s\' \tTime: %.2f(s)"%(self.encoded_path, self.output_path, self.time))
 
 
 def main(argv):
+    argv, trace_path = pop_trace_arg(argv)
     compressed, image = argv
     decompressor = arithmetic_decompress(compressed, image)
     decompressor.decompress(32)
     decompressor.write()
+    if trace_path:
+        decompressor.trace.dump(trace_path, codec = "arithmetic", mode = "decompress", input = argv[0], output = argv[1])
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,131 @@
+# - Packed bit streams shared by every codec.
+#   Bits are kept in memory as real bytes (MSB first), instead of
+#   one "0"/"1" character per bit in a temp file.
+
+class bitOutStream:
+    def __init__(self):
+
+        # Bytes already packed
+        self.buffer = bytearray()
+
+        # - Accumulator of bits not flushed yet,
+        #   flushed to buffer once it holds a word (64 bits)
+        self.acc    = 0
+        self.numacc = 0
+
+        # Total number of bits written
+        self.length = 0
+
+    # append a bitstring ("0101...") into stream
+    def write(self, bitstring):
+        if len(bitstring) > 0:
+            self.write_bits(int(bitstring, 2), len(bitstring))
+
+    # append one bit (0 or 1)
+    def write_bit(self, bit):
+        self.acc = (self.acc << 1) | bit
+        self.numacc += 1
+        self.length += 1
+        if self.numacc >= 64:
+            self.flush()
+
+    # append the numbits lowest bits of value
+    def write_bits(self, value, numbits):
+        self.acc = (self.acc << numbits) | value
+        self.numacc += numbits
+        self.length += numbits
+        if self.numacc >= 64:
+            self.flush()
+
+    # - append whole bytes, copied straight into buffer
+    #   when the stream is on a byte boundary
+    def write_bytes(self, data):
+        self.flush()
+        if self.numacc == 0:
+            self.buffer += data
+            self.length += 8 * len(data)
+        elif len(data) > 0:
+            self.write_bits(int.from_bytes(data, 'big'), 8 * len(data))
+
+    # append all bits of another bitOutStream
+    def write_stream(self, other):
+        if other.length % 8 == 0:
+            self.write_bytes(other.getbytes())
+        elif other.length > 0:
+            pad = -other.length % 8
+            value = int.from_bytes(other.getbytes(), 'big') >> pad
+            self.write_bits(value, other.length)
+
+    # move every whole byte of accumulator into buffer
+    def flush(self):
+        numbytes = self.numacc >> 3
+        if numbytes > 0:
+            rest = self.numacc & 7
+            self.buffer += (self.acc >> rest).to_bytes(numbytes, 'big')
+            self.acc &= (1 << rest) - 1
+            self.numacc = rest
+
+    # get packed bytes, the last byte is padded with "0"
+    def getbytes(self):
+        self.flush()
+        if self.numacc > 0:
+            return bytes(self.buffer) + bytes([self.acc << (8 - self.numacc)])
+        return bytes(self.buffer)
+
+    # terminate writing
+    def close(self):
+        self.flush()
+
+    def __len__(self):
+        return self.length
+
+
+# Reading a packed bitstream
+class bitInStream:
+    def __init__(self, data, numbits = None, position = 0):
+
+        # Packed bytes
+        self.data = data
+
+        # Number of valid bits on data
+        self.numbits = len(data) * 8 if numbits is None else numbits
+
+        # Position of next bit to read
+        self.position = position
+
+    # read one bit, None if stream is over
+    def read(self):
+        pos = self.position
+        if pos >= self.numbits:
+            return None
+        self.position = pos + 1
+        return (self.data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    # read numbits bits as an integer, None if stream is over
+    def read_bits(self, numbits):
+        pos = self.position
+        if pos + numbits > self.numbits:
+            return None
+        start = pos >> 3
+        end   = (pos + numbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start: end], 'big')
+        self.position = pos + numbits
+        return (chunk >> ((end << 3) - pos - numbits)) & ((1 << numbits) - 1)
+
+    # - read numbytes whole bytes, sliced straight from data
+    #   when position is on a byte
+    def read_bytes(self, numbytes):
+        pos = self.position
+        if pos + 8 * numbytes > self.numbits:
+            return None
+        if pos & 7 == 0:
+            self.position = pos + 8 * numbytes
+            return bytes(self.data[pos >> 3: (pos >> 3) + numbytes])
+        return self.read_bits(8 * numbytes).to_bytes(numbytes, 'big')
+
+    # number of bits left
+    def remaining(self):
+        return self.numbits - self.position
+
+    def close(self):
+        pass
@@ -0,0 +1,60 @@
+import numpy as np
+
+# - Vectorised encoder for prefix codes (huffman, shannon-fano).
+#   Codewords are changed into arrays of code values and code lengths,
+#   a whole array of symbols is encoded with NumPy, without calling
+#   python code for each symbol.
+class codeBook:
+    def __init__(self, codewords, keybits = 8):
+
+        # - Codewords in format {key (int): code (bitstring)},
+        #   key is a symbol or a group of symbols packed in keybits bits
+        self.keybits = keybits
+
+        # Longest code length
+        self.maxlen = max(len(code) for code in codewords.values())
+        dtype = np.uint32 if self.maxlen <= 32 else np.uint64
+
+        keys    = sorted(codewords.keys())
+        codes   = np.array([int(codewords[key], 2) for key in keys], dtype = dtype)
+        lengths = np.array([len(codewords[key]) for key in keys], dtype = np.uint8)
+
+        # - Small alphabet (<= 16 bits): code and length arrays
+        #   are indexed directly by symbol,
+        #   otherwise keys are sorted and found by binary search
+        if keybits <= 16:
+            self.keys    = None
+            self.codes   = np.zeros(1 << keybits, dtype = dtype)
+            self.lengths = np.zeros(1 << keybits, dtype = np.uint8)
+            self.codes[keys]   = codes
+            self.lengths[keys] = lengths
+        else:
+            self.keys    = np.array(keys, dtype = np.uint64)
+            self.codes   = codes
+            self.lengths = lengths
+
+    # get code values and code lengths of an array of keys
+    def lookup(self, keys):
+        if self.keys is None:
+            return self.codes[keys], self.lengths[keys]
+        index = np.searchsorted(self.keys, keys)
+        return self.codes[index], self.lengths[index]
+
+    # - Encode an array of keys into bitout, chunk by chunk:
+    #   prefix sums of lengths give where every code ends,
+    #   then each output bit is taken out of its code and packed
+    def encode(self, keys, bitout, chunk = 1 << 18):
+        for start in range(0, len(keys), chunk):
+            codes, lengths = self.lookup(keys[start: start + chunk])
+            ends    = np.cumsum(lengths, dtype = np.int64)
+            numbits = int(ends[-1])
+            if numbits == 0:
+                continue
+
+            # code of each output bit and its shift on that code
+            owner = np.repeat(np.arange(len(codes)), lengths)
+            shift = (ends[owner] - 1 - np.arange(numbits)).astype(codes.dtype)
+            bits  = ((codes[owner] >> shift) & 1).astype(np.uint8)
+
+            packed = np.packbits(bits).tobytes()
+            bitout.write_bits(int.from_bytes(packed, 'big') >> (-numbits % 8), numbits)
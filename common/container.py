@@ -0,0 +1,229 @@
+import os
+import mmap
+import struct
+
+from bitstream import bitOutStream, bitInStream
+
+# - Container of a compressed image (instead of pickle of a bytearray),
+#   a fixed header, little endian:
+#   magic "IMGC" (4 bytes) + version (1 byte) + codec id (1 byte) +
+#   + number of channels (1 byte) + channel layout (1 byte) +
+#   + w (4 bytes) + h (4 bytes) +
+#   + model offset (8 bytes) + model numbits (8 bytes) +
+#   + payload offset (8 bytes) + payload numbits (8 bytes)
+#   then the model section (codec parameters, code tables, ...)
+#   and the payload (encoded array), both starting on a byte.
+#   So the header is read with struct, the sections are reached
+#   by their offsets without reading anything before them
+MAGIC   = b'IMGC'
+VERSION = 1
+HEADER  = struct.Struct('<4sBBBBIIQQQQ')
+
+# codec ids
+codecs = ["huffman", "arithmetic", "lzw", "runlength", "shannonfano", "ans", "lz77"]
+
+# - Channel layouts: every codec encodes the Y, Cr, Cb planes
+#   one after the other. A tiled file (tools/tiled_compress.py)
+#   has a tile index as its model section and a full container
+#   (planar) of each tile, one after the other, as its payload
+layouts = ["YCrCb-planar", "YCrCb-tiled"]
+
+# - Names of codec parameters saved as an index on the model section,
+#   kept here so metadata is read without importing a codec
+
+# Coder backends of arithmetic coding
+coders = ["arithmetic", "range"]
+
+# - Models of arithmetic coding
+#   "static"   : frequencies counted first and saved on file
+#   "adaptive" : one adaptive model for all symbols
+#   "channel"  : one adaptive model for each channel (Y, Cr, Cb)
+#   "previous" : one adaptive model for each channel and
+#                quantised value of the previous symbol
+models = ["static", "adaptive", "channel", "previous"]
+
+# - Serialisation of symbols and run-lengths of runlength coding:
+#   "bits"  : 5bits length of each run-length + its bits
+#   "varint": byte aligned, symbols as bytes and run-lengths
+#             as LEB128 varints (7 bits per byte, high bit set
+#             on every byte but the last one of a value)
+formats = ["bits", "varint"]
+
+# - Tile index: tile rows (4 bytes) + tile columns (4 bytes) +
+#   + number of tiles (4 bytes), then for each tile (row major)
+#   its offset from the payload (8 bytes) + its size in bytes (8 bytes)
+TILES = struct.Struct('<III')
+ENTRY = struct.Struct('<QQ')
+
+
+# - Write a container: model and payload are bitOutStreams,
+#   several payload streams are joined bit by bit.
+#   Return number of bytes written
+def write_container(path, codec, shape, model, *payload):
+    w, h = shape
+
+    model_bytes = model.getbytes()
+    out = bitOutStream()
+    for stream in payload:
+        out.write_stream(stream)
+    payload_bytes = out.getbytes()
+
+    model_offset   = HEADER.size
+    payload_offset = model_offset + len(model_bytes)
+    header = HEADER.pack(MAGIC, VERSION, codecs.index(codec), 3, layouts.index("YCrCb-planar"),
+                         w, h, model_offset, len(model), payload_offset, len(out))
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(model_bytes)
+        f.write(payload_bytes)
+    return payload_offset + len(payload_bytes)
+
+
+# - Parse the fixed header from the first bytes of a file
+#   into a dict of its fields
+def read_header(data, path = ""):
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise ValueError("Not a compressed image: %s" % path)
+
+    (_magic, version, codec, channels, layout, w, h,
+     model_offset, model_numbits,
+     payload_offset, payload_numbits) = HEADER.unpack_from(data)
+
+    if version != VERSION:
+        raise ValueError("Unsupported version: %d" % version)
+
+    return {
+        "version"         : version,
+        "codec"           : codecs[codec],
+        "channels"        : channels,
+        "layout"          : layouts[layout],
+        "shape"           : (w, h),
+        "model_offset"    : model_offset,
+        "model_numbits"   : model_numbits,
+        "payload_offset"  : payload_offset,
+        "payload_numbits" : payload_numbits,
+    }
+
+
+# - Metadata of a compressed image, only the fixed header
+#   is read from file. Shape (w, h) is (rows, columns) as in
+#   image.shape, so width is h and height is w. Sizes are in bytes
+def read_info(path):
+    with open(path, 'rb') as f:
+        header = read_header(f.read(HEADER.size), path)
+        f.seek(0, 2)
+        file_size = f.tell()
+
+    w, h = header["shape"]
+    return {
+        "codec"        : header["codec"],
+        "version"      : header["version"],
+        "width"        : h,
+        "height"       : w,
+        "channels"     : header["channels"],
+        "layout"       : header["layout"],
+        "model_size"   : (header["model_numbits"] + 7) // 8,
+        "payload_size" : (header["payload_numbits"] + 7) // 8,
+        "file_size"    : file_size,
+    }
+
+
+# - Write a tiled file tile by tile: the space of header and
+#   tile index is kept at the start, tiles (bytes of a container)
+#   are written as they come, header and index are written on close.
+#   So only one tile is held in memory
+class tiledWriter:
+    def __init__(self, path, codec, shape, tile_shape, numtiles):
+        self.codec = codec
+        self.shape = shape
+        self.tile_shape = tile_shape
+        self.numtiles = numtiles
+
+        # (offset from payload, size) of tiles written
+        self.entries = []
+        self.payload_size = 0
+
+        self.model_offset   = HEADER.size
+        self.payload_offset = self.model_offset + TILES.size + numtiles * ENTRY.size
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.seek(self.payload_offset)
+
+    def add(self, data):
+        self.file.write(data)
+        self.entries.append((self.payload_size, len(data)))
+        self.payload_size += len(data)
+
+    # close and remove a file left unfinished (eg: a tile failed)
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    # write header and tile index, return number of bytes of file
+    def close(self):
+        if len(self.entries) != self.numtiles:
+            raise ValueError("Expected %d tiles, got %d" % (self.numtiles, len(self.entries)))
+        w, h = self.shape
+        index_size = self.payload_offset - self.model_offset
+        header = HEADER.pack(MAGIC, VERSION, codecs.index(self.codec), 3, layouts.index("YCrCb-tiled"),
+                             w, h, self.model_offset, 8 * index_size, self.payload_offset, 8 * self.payload_size)
+
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.write(TILES.pack(self.tile_shape[0], self.tile_shape[1], self.numtiles))
+        for entry in self.entries:
+            self.file.write(ENTRY.pack(*entry))
+        self.file.close()
+        return self.payload_offset + self.payload_size
+
+
+# - Read a container, the file is memory mapped,
+#   only the fixed header is parsed here. Codec scripts
+#   read planar files of their own codec only, layout (or codec)
+#   None takes any layout (or codec)
+class container:
+    def __init__(self, path, layout = "YCrCb-planar", codec = None):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        header = read_header(self.data, path)
+        if layout is not None and header["layout"] != layout:
+            raise ValueError("Layout of %s is %s, not %s" % (path, header["layout"], layout))
+        if codec is not None and header["codec"] != codec:
+            raise ValueError("%s is a %s file, not %s" % (path, header["codec"], codec))
+        self.version  = header["version"]
+        self.codec    = header["codec"]
+        self.channels = header["channels"]
+        self.layout   = header["layout"]
+        self.shape    = header["shape"]
+        self.model_offset    = header["model_offset"]
+        self.model_numbits   = header["model_numbits"]
+        self.payload_offset  = header["payload_offset"]
+        self.payload_numbits = header["payload_numbits"]
+
+    # bitstream over the model section
+    def model(self):
+        start = 8 * self.model_offset
+        return bitInStream(self.data, start + self.model_numbits, start)
+
+    # bitstream over the payload
+    def payload(self):
+        start = 8 * self.payload_offset
+        return bitInStream(self.data, start + self.payload_numbits, start)
+
+    # - Tile index of a tiled file: (tile rows, tile columns),
+    #   [(offset in file, size in bytes)] of each tile
+    def tiles(self):
+        tile_rows, tile_cols, numtiles = TILES.unpack_from(self.data, self.model_offset)
+        entries = []
+        for i in range(numtiles):
+            offset, size = ENTRY.unpack_from(self.data, self.model_offset + TILES.size + i * ENTRY.size)
+            entries.append((self.payload_offset + offset, size))
+        return (tile_rows, tile_cols), entries
+
+    # bytes of a tile, itself a planar container
+    def tile(self, entry):
+        offset, size = entry
+        return self.data[offset: offset + size]
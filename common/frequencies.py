@@ -0,0 +1,18 @@
+import numpy as np
+
+# Frequency helpers shared by codecs counting symbols of a uint8 array
+
+# - Index of the first occurrence of each symbol on a uint8 array,
+#   {symbol: index}. Chunks are scanned until every symbol
+#   (numsymbols of them) is seen, instead of sorting the whole array
+def first_occurrence(array, numsymbols):
+    first = {}
+    step = 1 << 16
+    for start in range(0, len(array), step):
+        values, index = np.unique(array[start: start + step], return_index = True)
+        for value, i in zip(values.tolist(), index.tolist()):
+            if value not in first:
+                first[value] = start + i
+        if len(first) >= numsymbols:
+            break
+    return first
@@ -0,0 +1,109 @@
+# - Table-driven decoder for prefix codes (huffman, shannon-fano).
+#   Instead of reading one bit at a time and probing a dictionary,
+#   "numbits" bits are looked up at once in a primary table,
+#   codes longer than that go on to a secondary table of their prefix,
+#   and so on: secondary tables are at most "subbits" wide, so no table
+#   grows with the longest code (codes may be up to 63 bits long).
+
+class prefixTable:
+    def __init__(self, codewords, numbits = 11):
+
+        # - Codewords in format {symbols (bytes) : code (bitstring)},
+        #   symbols are written to output as they are
+        self.codewords = codewords
+
+        # Number of bits indexing the primary table
+        self.numbits = numbits
+
+        # Largest number of bits indexing a secondary table
+        self.subbits = 8
+
+        # Longest code length
+        self.maxlen = max(len(code) for code in codewords.values())
+
+        # - Primary table, for each index:
+        #   lengths[index] > 0 : code length and symbols[index] are its symbols
+        #   lengths[index] = 0 : symbols[index] is a secondary table
+        #                        (bits, lengths, symbols), itself with
+        #                        secondary tables for longer codes
+        self.lengths, self.symbols = self.make_table(list(codewords.items()), numbits, 0)
+
+    # - Table indexed by "bits" bits, for codes [(symbols, rest of code)]
+    #   after "consumed" bits. Fill every index starting with a code,
+    #   eg: with bits = 3 code "01" fills index "010" and "011",
+    #   longer codes go to a secondary table of their first "bits" bits
+    def make_table(self, codes, bits, consumed):
+        lengths = [0] * (1 << bits)
+        table   = [None] * (1 << bits)
+
+        longer = {}
+        for symbols, rest in codes:
+            if len(rest) > bits:
+                longer.setdefault(int(rest[:bits], 2), []).append((symbols, rest[bits:]))
+                continue
+            start = int(rest, 2) << (bits - len(rest)) if rest else 0
+            count = 1 << (bits - len(rest))
+            lengths[start: start + count] = [consumed + len(rest)] * count
+            table[start: start + count]   = [symbols] * count
+
+        # secondary tables are as wide as their longest rest, up to subbits
+        for prefix, subcodes in longer.items():
+            subbits = min(self.subbits, max(len(rest) for _, rest in subcodes))
+            table[prefix] = (subbits,) + self.make_table(subcodes, subbits, consumed + bits)
+        return lengths, table
+
+    # - Decode every code left on bitin into output
+    #   (a preallocated bytearray), return number of bytes written
+    def decode(self, bitin, output):
+        data  = bitin.data
+        total = bitin.numbits
+        pos   = bitin.position
+
+        numbits = self.numbits
+        mask    = (1 << numbits) - 1
+        need    = max(self.maxlen, numbits)
+        lengths, symbols = self.lengths, self.symbols
+
+        # Accumulator of bits (nacc bits) read from data
+        index = pos >> 3
+        acc   = 0
+        nacc  = 0
+        if pos < total:
+            acc   = data[index] & ((1 << (8 - (pos & 7))) - 1)
+            nacc  = 8 - (pos & 7)
+            index += 1
+
+        i = 0
+        while pos < total:
+            # Refill a word at a time
+            while nacc < need:
+                acc = (acc << 64) | int.from_bytes(data[index: index + 8].ljust(8, b'\0'), 'big')
+                index += 8
+                nacc  += 64
+
+            key    = (acc >> (nacc - numbits)) & mask
+            length = lengths[key]
+            value  = symbols[key]
+            if not length:
+                # walk down secondary tables until a code ends
+                consumed = numbits
+                while not length:
+                    if value is None:
+                        raise ValueError("Invalid code at bit %d" % pos)
+                    bits, sublengths, subsymbols = value
+                    consumed += bits
+                    key    = (acc >> (nacc - consumed)) & ((1 << bits) - 1)
+                    length = sublengths[key]
+                    value  = subsymbols[key]
+                if value is None:
+                    raise ValueError("Invalid code at bit %d" % pos)
+
+            nacc -= length
+            acc  &= (1 << nacc) - 1
+            pos  += length
+
+            output[i: i + len(value)] = value
+            i += len(value)
+
+        bitin.position = pos
+        return i
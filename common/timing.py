@@ -0,0 +1,74 @@
+import json
+import time
+from contextlib import contextmanager
+
+# - Per-stage timing of compressors and decompressors.
+#   Each stage runs inside a span:
+#       with self.trace.span("encode"):
+#           ...
+#   every finished span is kept on the tracer and given to callbacks,
+#   callbacks added by add_listener get the spans of every tracer
+
+# callbacks of every tracer: callback(name, seconds)
+listeners = []
+
+def add_listener(callback):
+    listeners.append(callback)
+
+def remove_listener(callback):
+    listeners.remove(callback)
+
+
+class tracer:
+    def __init__(self, callback = None):
+
+        # Finished spans in order: [(name, seconds)]
+        self.spans = []
+
+        # Callbacks of this tracer only
+        self.callbacks = [callback] if callback is not None else []
+
+    @contextmanager
+    def span(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t
+            self.spans.append((name, elapsed))
+            for callback in self.callbacks + listeners:
+                callback(name, elapsed)
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    # total time of each stage name (a stage may run more than once)
+    def get_times(self):
+        times = {}
+        for name, elapsed in self.spans:
+            times[name] = times.get(name, 0.0) + elapsed
+        return times
+
+    # - Append spans to a JSON-lines file, one object for each span
+    #   with fields given in "fields" (eg: input, output path)
+    def dump(self, path, **fields):
+        with open(path, 'a') as f:
+            for name, elapsed in self.spans:
+                record = dict(fields)
+                record["stage"] = name
+                record["time"]  = elapsed
+                f.write(json.dumps(record) + "\n")
+
+
+# - Take "--trace path" out of argv of a script,
+#   return (the other arguments, path or None)
+def pop_trace_arg(argv):
+    argv = list(argv)
+    if "--trace" in argv:
+        i = argv.index("--trace")
+        if i + 1 >= len(argv):
+            raise ValueError("--trace needs a file path")
+        path = argv[i + 1]
+        del argv[i: i + 2]
+        return argv, path
+    return argv, None
@@ -1,5 +1,16 @@
 import heapq
 import os
+import sys
+import numpy as np
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from container import container, write_container
+from timing import tracer, pop_trace_arg
+from prefixtable import prefixTable
+from codebook import codeBook
+
 # - Node for huffman Tree
 class node:
     def __init__(self, data = None, weight = 0, code = ""):
@@ -35,6 +46,9 @@ class huffmanTree:
         
         # Codewords created by huff man tree
         self.codewords = {}
+
+        # Code length of each codeword
+        self.lengths = {}
         
     # Make heap nodes from frequencies table
     def make_heap_nodes(self):
@@ -84,56 +98,134 @@ class huffmanTree:
         leng_heap = len(self.heap_nodes)
         for _ in range(leng_heap - 1):
             self.update_root()
+
+        # Only one symbol, the root is the leaf itself
+        if leng_heap == 1:
+            self.root = self.heap_nodes[0]
         
         # Generate codewords
         self.make_codewords(self.root)
 
+        # - Keep only code lengths of the tree (at least 1 bit),
+        #   codewords are reassigned as canonical huffman codes
+        for key, code in self.codewords.items():
+            self.lengths[key] = max(len(code), 1)
+        self.codewords = canonical_codewords(self.lengths)
+
     def get_codewords(self):
         return self.codewords
 
+    def get_lengths(self):
+        return self.lengths
+
+# - Write code lengths (canonical huffman) {key: length} into bitout:
+#   max_length(6bits), then number of codes on each length
+#   1..max_length: length_count(5bits) + count(?bits),
+#   then keys (bitstrings) in canonical order
+def write_lengths(bitout, lengths):
+    max_length = max(lengths.values()) if len(lengths) > 0 else 0
+    bitout.write_bits(max_length, 6)
+    counts = [0] * (max_length + 1)
+    for length in lengths.values():
+        counts[length] += 1
+    for count in counts[1:]:
+        bitout.write_bits(count.bit_length(), 5)
+        bitout.write_bits(count, count.bit_length())
+    for key, _ in sorted(lengths.items(), key = lambda x: (x[1], x[0])):
+        bitout.write(key)
+
+# - Read code lengths written by write_lengths,
+#   keys are extended_size * 8 bits
+def read_lengths(bitin, extended_size = 1):
+    lengths = {}
+    max_length = bitin.read_bits(6)
+    counts = []
+    for _ in range(max_length):
+        length_count = bitin.read_bits(5)
+        counts.append(bitin.read_bits(length_count))
+    format_key = '{:0' + str(8 * extended_size) + 'b}'
+    for length, count in enumerate(counts, 1):
+        for _ in range(count):
+            key = bitin.read_bits(8 * extended_size)
+            lengths[format_key.format(key)] = length
+    return lengths
+
+# - Pack each group of extended_size symbols on array into
+#   an integer key (8 bits per symbol), a last group which is
+#   not full is dropped
+def group_keys(array, extended_size):
+    array = np.asarray(array, dtype = np.uint8)
+    if extended_size == 1:
+        return array
+
+    array = array[: len(array) // extended_size * extended_size]
+    array = array.reshape((-1, extended_size)).astype(np.uint64)
+    keys  = np.zeros(len(array), dtype = np.uint64)
+    for i in range(extended_size):
+        keys = (keys << np.uint64(8)) | array[:, i]
+    return keys
+
+# - Canonical huffman codes from code lengths {key: length},
+#   keys are sorted by (length, key), the first code is all "0",
+#   the next one is the previous code + 1, shifted left
+#   whenever the length grows. So the lengths are enough
+#   to rebuild codewords, no tree is needed
+def canonical_codewords(lengths):
+    codewords = {}
+    code = 0
+    last_length = 0
+    for key, length in sorted(lengths.items(), key = lambda x: (x[1], x[0])):
+        code <<= length - last_length
+        codewords[key] = '{:0{}b}'.format(code, length)
+        code += 1
+        last_length = length
+    return codewords
+
 class freqTable:
     def __init__(self, arr = [], extended_size = 1):
         
         self.array = arr
 
-        # frequencies talbe
+        # - Frequencies table {(symbols): frequency}
+        #   keys are groups of extended_size symbols
         self.freqs = {}
 
         # Use for extended huffman coding
-        # with extended_size = 2,
-        # {'a' : ?, 'b', ?} becomes
-        # {'aa': ?, 'ab' : ?, 'ba' : ?, 'bb': ?}
+        # with extended_size = 2, "abab" is counted as
+        # {('a', 'b') : 2}, only groups occuring on array are kept
         self.extended_size = extended_size
         
         # Heap nodes of freqs table
         self.heap_nodes = []
         heapq.heapify(self.heap_nodes)
 
+    # - Count groups of extended_size symbols on one pass,
+    #   np.unique (np.bincount for single symbols)
+    #   counts all packed keys at once
     def make_freqs(self):
-        for key in self.array:
-            if key not in self.freqs:
-                self.freqs[key]  = 1
-            else:
-                self.freqs[key] += 1
-    
-    # - Backtracking to create nodes with data is
-    #   a set of elements in self.array,
-    #   then push them into heap_nodes
-    def push_to_heap(self, set_elements, i, weight):
-        if i < self.extended_size:
-            for key, value in self.freqs.items():
-                self.push_to_heap(set_elements + [key], i + 1, weight + value)
+        k = self.extended_size
+        keys = group_keys(self.array, k)
+        if k == 1:
+            counts = np.bincount(keys, minlength = 256)
+            values = np.flatnonzero(counts)
+            counts = counts[values]
         else:
-            newnode = node(data = set_elements, weight = weight)
-            heapq.heappush(self.heap_nodes, newnode)
+            values, counts = np.unique(keys, return_counts = True)
 
+        for value, count in zip(values.tolist(), counts.tolist()):
+            key = tuple((value >> (8 * (k - 1 - i))) & 255 for i in range(k))
+            self.freqs[key] = count
+    
+    # - Create a node for each group of symbols
+    #   on frequencies table, then heapify them
     def make_heap_nodes(self):
         # make frequencies dict
         if len(self.freqs) == 0:
             self.make_freqs()
 
         # create heap_nodes
-        self.push_to_heap(set_elements = [], i = 0, weight = 0)
+        self.heap_nodes = [node(data = list(key), weight = value) for key, value in self.freqs.items()]
+        heapq.heapify(self.heap_nodes)
     
     def set_freqs(self, freqs):
         self.freqs = freqs
@@ -145,99 +237,59 @@ class freqTable:
 
 
 class encoder:
-    def __init__(self, codewords, bitout):
+    def __init__(self, codewords, bitout, extended_size = 1):
         
         # Codewords create from huffman Tree
         self.codewords = codewords
         
-        # Bitout stream to write to a file,
-        # for efficent memorry usage
-        self.output = bitout
+        # - Code and length arrays of codewords, keys (bitstring
+        #   of symbols) are packed into integer keys
+        self.extended_size = extended_size
+        int_codewords = {int(key, 2): code for key, code in codewords.items()}
+        self.codebook = codeBook(int_codewords, 8 * extended_size)
 
-    def encode(self, set_of_symbols):
-        # change set of symbols into string
-        string = ""
-        for symbol in set_of_symbols:
-            string += "{:08b}".format(symbol)
+        # Bitout stream to write packed bits
+        self.output = bitout
 
-        if string in self.codewords:
-            code = self.codewords[string]
-            self.output.write(code)
+    # encode the whole array, groups of extended_size symbols at once
+    def encode(self, array):
+        keys = group_keys(array, self.extended_size)
+        self.codebook.encode(keys, self.output)
 
     def finish(self):
         self.output.close()
 
 
 class decoder:
-    def __init__(self, codewords, bitin):
+    def __init__(self, codewords, bitin, length, numbits = 11):
 
         # codewords
         self.codewords = codewords
         
-        # reverse codewords:
-        self.rev_codewords = dict(zip(codewords.values(), codewords.keys()))
-
-        # Bitstream file encoded by codewords
+        # - Lookup table of codewords, consuming "numbits" bits
+        #   at once, the keys (bitstring of symbols) are changed
+        #   into bytes of symbols
+        table_codewords = {}
+        for key, code in codewords.items():
+            symbols = bytes(int(key[i: i + 8], 2) for i in range(0, len(key), 8))
+            table_codewords[symbols] = code
+        self.table = prefixTable(table_codewords, numbits)
+
+        # Bitstream encoded by codewords
         self.input = bitin
         
-        # current value
-        self.value = ""
-        
-        # array decoded
-        self.array = []
+        # array decoded, preallocated with length of array
+        self.array  = bytearray(length)
+        self.length = 0
 
 
+    # decode the whole bitstream into array
     def decode(self):
-        bit = self.input.read()
-        if bit == None:
-            return None
-        self.value += bit
-        if self.value in self.rev_codewords:
-            string_keys = self.rev_codewords[self.value]
-            for i in range(0, len(string_keys), 8):
-                self.array.append(int(string_keys[i: i+8], 2))
-            self.value = ""    
-        return 1
+        self.length = self.table.decode(self.input, self.array)
+        return self.length
 
     def finish(self):
         self.input.close()
 
     def get_array(self):
-        return self.array
-
-# table of frequencies create from an array
-# Writting to temp file (for better saving memory)
-class bitOutStream:
-    def __init__(self, stringpath):
-        
-        if os.path.exists(stringpath):
-            os.remove(stringpath)
-
-        self.stringpath = stringpath
-        self.stringout = open(stringpath, 'a+')
-
-    # append bitstring into string file
-    def write(self, bitstring):
-        self.stringout.write(str(bitstring))
-
-    # terminate writing
-    def close(self):
-        self.stringout.close()
-
-
-# Reading input bitstream
-class bitInStream:
-    def __init__(self, stringpath):
-        assert os.path.exists(stringpath)
-        self.stringpath = stringpath
-        self.stringin = open(stringpath, 'r')
-
-    def read(self):
-        bit = self.stringin.read(1)
-        if bit == '':
-            return None
-        return bit
-
-    def close(self):
-        self.stringin.close()
-
+        return memoryview(self.array)[: self.length]
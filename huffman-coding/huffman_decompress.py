@@ -2,7 +2,6 @@ import os
 import cv2
 import sys
 import time
-import pickle
 import numpy as np
 import huffman_coding
 
@@ -12,8 +11,11 @@ class huffman_decompress:
         self.input_path  = encoded_path
         self.output_path = image_output_path
         
-        # string tem file to read bit in
-        self.string_path = "temp"
+        # bitstream of encoded array
+        self.bitin = None
+
+        # container of the compressed file (memory mapped)
+        self.file = None
 
         # Image output and shape (w, h)
         self.image = None
@@ -25,8 +27,8 @@ class huffman_decompress:
         # extended size (if 1: normal huffman)
         self.extended_size = None
 
-        # Array's frequencies
-        self.freqs = {}
+        # Code length of each codeword (canonical huffman)
+        self.lengths = {}
     
         # length of  encoded array string
         self.length_encoded = None
@@ -34,113 +36,89 @@ class huffman_decompress:
         # Time processing
         self.time = time.time()
 
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = huffman_coding.tracer()
+
         self.read()
 
     # Read from compressed file 
     def read(self):
         
-        # Read byte compressed to encoded_text
-        encoded_text = ""
-        with open(self.input_path, 'rb') as f:
-            byte_array = pickle.load(f)
-        for byte in byte_array:
-            encoded_text += '{:08b}'.format(byte)
-        
-        # Delete some "0" bit at first
-        num_zero = int(encoded_text[-8:], 2)
-        encoded_text = encoded_text[num_zero : -8]
-        # Read image's shape
-        w_length = int(encoded_text[:5], 2)
-        self.w   = int(encoded_text[5: 5 + w_length], 2)
-        h_length = int(encoded_text[5 + w_length: 10 + w_length], 2)
-        self.h   = int(encoded_text[10 + w_length: 10 + w_length + h_length], 2)
-        encoded_text = encoded_text[10 + w_length + h_length: ]
-        
-        # Read frequencies dictionary
-        leng_freqs = int(encoded_text[:9], 2)
-        encoded_text = encoded_text[9:]
-        i = 0
-        while i < leng_freqs:
-            key = int(encoded_text[:8], 2)
-            length_freq = int(encoded_text[8: 13], 2)
-            freq_value  = int(encoded_text[13: 13 + length_freq], 2)
-            self.freqs[key] = freq_value
-            encoded_text = encoded_text[13 + length_freq: ]
-            i += 1
-        
-        # Get extended_size
-        self.extended_size = int(encoded_text[:8],2)
-        encoded_text = encoded_text[8:]
+        with self.trace.span("read"):
+            # Open the container (memory mapped), shape is on its header
+            self.file = huffman_coding.container(self.input_path, codec = "huffman")
+            self.w, self.h = self.file.shape
+
+            # Model section: codec parameters and tables
+            self.bitin = self.file.model()
         
+        with self.trace.span("model"):
+            # Get extended_size
+            self.extended_size = self.bitin.read_bits(8)
+
+            # - Read code lengths: max_length(6bits), number of codes
+            #   on each length, then keys in canonical order
+            self.lengths = huffman_coding.read_lengths(self.bitin, self.extended_size)
         
-        # length encoded_text
-        self.length_encoded = len(encoded_text)
-        # Save the rest into temp
-        with open(self.string_path, "w") as f:
-            f.write(encoded_text)
+        # encoded array, the payload of container
+        self.bitin = self.file.payload()
+        self.length_encoded = self.bitin.remaining()
 
     # Covert 1D array into image
     def toimage(self):
         w, h = self.w, self.h
         
         # Subtract 1D array into 3 sub arrays
-        Y_array  = self.array[: w*h]
-        Cr_array = self.array[w*h : 2*w*h]
-        Cb_array = self.array[2*w*h : 3*w*h]
-        
-        # convert array into 3 channels image
-        Y  = np.array(Y_array).reshape((w,h))
-        Cr = np.array(Cr_array).reshape((w,h))
-        Cb = np.array(Cb_array).reshape((w,h))
-        
-        # Create a copy zero image
-        image = np.zeros((w,h,3), dtype = np.uint8)
-        image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
+        with self.trace.span("reshape"):
+            Y_array  = self.array[: w*h]
+            Cr_array = self.array[w*h : 2*w*h]
+            Cb_array = self.array[2*w*h : 3*w*h]
+
+            # convert array into 3 channels image
+            Y  = Y_array.reshape((w,h))
+            Cr = Cr_array.reshape((w,h))
+            Cb = Cb_array.reshape((w,h))
+
+            # Create a copy zero image
+            image = np.zeros((w,h,3), dtype = np.uint8)
+            image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
         
         # Convert to RGB
-        self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
+        with self.trace.span("color"):
+            self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
 
 
     def decompress(self):
-        # Create freq table
-        freq_table = huffman_coding.freqTable(extended_size = self.extended_size)
-        freq_table.set_freqs(self.freqs)
-        
-        # Create codewords
-        h_tree = huffman_coding.huffmanTree(freq_table)
-        h_tree.make_tree()
-        codewords = h_tree.get_codewords()
-        
-        # set up bit stream input
-        bitin = huffman_coding.bitInStream(self.string_path)
-
-        decoder = huffman_coding.decoder(codewords, bitin)
+        with self.trace.span("model"):
+            # Create canonical codewords from code lengths
+            codewords = huffman_coding.canonical_codewords(self.lengths)
         
-        percent = 0
-        i = 0
-        while decoder.decode():
-            if i * 100.0 / self.length_encoded > percent:
-                percent += 1
-                sys.stdout.write("Processing:\t{} % \r".format(percent))
-                sys.stdout.flush()
-            i += 1
-        print('')
-        decoder.finish()
-        self.array = decoder.get_array()
+        with self.trace.span("decode"):
+            # - Decode with lookup tables, array is preallocated
+            #   with size of image (and some last elements added)
+            length = self.w * self.h * 3 + self.extended_size
+            decoder = huffman_coding.decoder(codewords, self.bitin, length)
+            decoder.decode()
+            decoder.finish()
+            self.array = np.frombuffer(decoder.get_array(), dtype = np.uint8)
         self.toimage()
 
     def write(self):
-        cv2.imwrite(self.output_path, self.image)
+        with self.trace.span("write"):
+            cv2.imwrite(self.output_path, self.image)
         self.time = time.time() - self.time
         print("Input: \'%s\' \tOutput: \'%s\' \tTime: %.2f(s)"%(self.input_path, self.output_path, self.time))
 
 
 def main(argv):
+    argv, trace_path = huffman_coding.pop_trace_arg(argv)
     input_path, image_path = argv
     
     decompressor = huffman_decompress(input_path, image_path)
     decompressor.decompress()
     decompressor.write()
+    if trace_path:
+        decompressor.trace.dump(trace_path, codec = "huffman", mode = "decompress", input = argv[0], output = argv[1])
 
 if __name__ == "__main__":
     main(sys.argv[1:])
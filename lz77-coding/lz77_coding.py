@@ -0,0 +1,232 @@
+import os
+import sys
+import array
+import numpy as np
+
+# - Shared bit streams live in ../common, literals, lengths and distances
+#   are coded with canonical huffman codes of ../huffman-coding
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(_root, 'common'))
+sys.path.insert(0, os.path.join(_root, 'huffman-coding'))
+from bitstream import bitOutStream, bitInStream
+from container import container, write_container
+from timing import tracer, pop_trace_arg
+import huffman_coding
+
+# - Effort levels: (max_chain, nice_length, lazy)
+#   max_chain  : number of earlier positions tried on a hash chain
+#   nice_length: a match this long is taken without searching further
+#   lazy       : before taking a match, check whether the next position
+#                has a longer one (then a literal is emitted first)
+levels = {
+    1: (4,    8,   False),
+    2: (8,    16,  False),
+    3: (16,   32,  False),
+    4: (16,   32,  True),
+    5: (32,   64,  True),
+    6: (64,   128, True),
+    7: (128,  258, True),
+    8: (256,  258, True),
+    9: (1024, 258, True),
+}
+
+
+class lz77_coding:
+    def __init__(self):
+
+        # - Matches are 3..258 symbols long (length - 3 fits 8 bits),
+        #   distances are 1..32768 (distance - 1 fits 15 bits)
+        self.min_match = 3
+        self.max_match = 258
+        self.window    = 1 << 15
+
+
+class encoder(lz77_coding):
+    def __init__(self, level = 6):
+        lz77_coding.__init__(self)
+
+        if level not in levels:
+            raise ValueError("Level must be between 1 and 9")
+        self.level = level
+        self.max_chain, self.nice_length, self.lazy = levels[level]
+
+        # - Tokens: flags (0 literal, 1 match) in order, literals,
+        #   match lengths (minus min_match) and distances
+        self.flags     = bytearray()
+        self.literals  = bytearray()
+        self.lengths   = bytearray()
+        self.distances = array.array('i')
+
+        # - Hash chains: head {3 symbols packed in an integer : last position},
+        #   prev[position] is the previous position with the same 3 symbols
+        self.head = {}
+        self.prev = None
+
+        # Data encoded
+        self.data = b''
+
+    # add position i into hash chains
+    def insert(self, i):
+        data = self.data
+        if i + 3 <= len(data):
+            key = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+            self.prev[i] = self.head.get(key, -1)
+            self.head[key] = i
+
+    # number of equal symbols at a and b, up to maxlen
+    def match_length(self, a, b, maxlen):
+        data = self.data
+        length = 0
+        while length + 8 <= maxlen and data[a + length: a + length + 8] == data[b + length: b + length + 8]:
+            length += 8
+        while length < maxlen and data[a + length] == data[b + length]:
+            length += 1
+        return length
+
+    # - Longest match of position i on its hash chain,
+    #   return (length, distance), (0, 0) if there is none
+    def find(self, i):
+        data = self.data
+        maxlen = min(self.max_match, len(data) - i)
+        if maxlen < self.min_match:
+            return 0, 0
+
+        key  = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+        cand = self.head.get(key, -1)
+
+        best_length = self.min_match - 1
+        best_distance = 0
+        chain = self.max_chain
+        while cand >= 0 and i - cand <= self.window and chain > 0:
+            # quick reject: the symbol right after the best match must be equal
+            if data[cand + best_length] == data[i + best_length]:
+                length = self.match_length(cand, i, maxlen)
+                if length > best_length:
+                    best_length, best_distance = length, i - cand
+                    if length >= self.nice_length or length >= maxlen:
+                        break
+            cand = self.prev[cand]
+            chain -= 1
+
+        if best_distance == 0:
+            return 0, 0
+        return best_length, best_distance
+
+    # - Split data (bytes) into literals and matches,
+    #   greedy matching, or lazy with one step look ahead
+    def encode(self, data):
+        self.data = bytes(data)
+        n = len(self.data)
+        self.prev = array.array('i', bytes(4 * n))
+
+        flags, literals, lengths, distances = self.flags, self.literals, self.lengths, self.distances
+        min_match = self.min_match
+
+        # match of the current position already found on look ahead
+        found = None
+        i = 0
+        while i < n:
+            if found is not None:
+                length, distance = found
+                found = None
+            else:
+                length, distance = self.find(i)
+            self.insert(i)
+
+            # a longer match on the next position: emit a literal first
+            if self.lazy and length >= min_match and length < self.nice_length and i + 1 < n:
+                found = self.find(i + 1)
+                if found[0] > length:
+                    flags.append(0)
+                    literals.append(self.data[i])
+                    i += 1
+                    continue
+                found = None
+
+            if length >= min_match:
+                flags.append(1)
+                lengths.append(length - min_match)
+                distances.append(distance)
+                for j in range(i + 1, i + length):
+                    self.insert(j)
+                i += length
+            else:
+                flags.append(0)
+                literals.append(self.data[i])
+                i += 1
+
+    # - Streams of tokens, as uint8 arrays: flags, literals, lengths,
+    #   distances - 1 split into high byte and low byte
+    def get_streams(self):
+        distances = np.frombuffer(self.distances, dtype = np.int32) - 1
+        return [np.frombuffer(self.flags, dtype = np.uint8),
+                np.frombuffer(self.literals, dtype = np.uint8),
+                np.frombuffer(self.lengths, dtype = np.uint8),
+                (distances >> 8).astype(np.uint8),
+                (distances & 255).astype(np.uint8)]
+
+
+class decoder(lz77_coding):
+    def __init__(self, length):
+        lz77_coding.__init__(self)
+
+        # Array decoded, preallocated with its length
+        self.array  = bytearray(length)
+        self.length = 0
+
+    # - Rebuild data from tokens: a literal is copied, a match copies
+    #   "length" symbols starting "distance" symbols back
+    #   (they may overlap the symbols being written, eg: distance 1)
+    def decode(self, flags, literals, lengths, distances):
+        output = self.array
+        min_match = self.min_match
+        i  = 0
+        li = 0
+        mi = 0
+        for flag in flags:
+            if flag == 0:
+                output[i] = literals[li]
+                li += 1
+                i  += 1
+                continue
+
+            length   = lengths[mi] + min_match
+            distance = distances[mi]
+            mi += 1
+            start = i - distance
+            if distance >= length:
+                output[i: i + length] = output[start: start + length]
+            else:
+                phrase = output[start: i] * (length // distance + 1)
+                output[i: i + length] = phrase[: length]
+            i += length
+
+        self.length = i
+        return i
+
+    def get_array(self):
+        return memoryview(self.array)[: self.length]
+
+
+# - Huffman code a stream of uint8 symbols into bitout,
+#   return the code lengths {key (bitstring): length}
+def huffman_encode(stream, bitout):
+    if len(stream) == 0:
+        return {}
+    freq_table = huffman_coding.freqTable(stream, 1)
+    freq_table.make_freqs()
+    h_tree = huffman_coding.huffmanTree(freq_table)
+    h_tree.make_tree()
+    encoder = huffman_coding.encoder(h_tree.get_codewords(), bitout, 1)
+    encoder.encode(stream)
+    return h_tree.get_lengths()
+
+# - Decode "length" huffman coded symbols from bitin,
+#   with the code lengths {key (bitstring): length}
+def huffman_decode(lengths, bitin, length):
+    if length == 0:
+        return bytearray()
+    codewords = huffman_coding.canonical_codewords(lengths)
+    decoder = huffman_coding.decoder(codewords, bitin, length)
+    decoder.decode()
+    return decoder.get_array()
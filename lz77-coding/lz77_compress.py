@@ -0,0 +1,149 @@
+import os
+import cv2
+import time
+import numpy as np
+import sys
+
+import lz77_coding
+
+class lz77_compress:
+    def __init__(self, image_path, output_path, level = 6):
+
+        self.image_path  = image_path
+        self.output_path = output_path
+        
+        # - Bitstreams of encoded array: flags of tokens, then
+        #   huffman coded literals, lengths, distances (high, low byte)
+        self.bitout  = None
+        self.streams = []
+
+        # Code lengths of huffman coded streams
+        self.lengths = []
+
+        # Number of tokens (literals and matches)
+        self.numtokens = 0
+
+        # Image
+        self.image = None
+        # 1D array create from image
+        self.array = None
+        
+        # - Effort level (1..9): longer hash chains are searched
+        #   and lazy matching is used on higher levels
+        self.level = int(level)
+        if self.level not in lz77_coding.levels:
+            raise ValueError("Level must be between 1 and 9")
+
+        # Number of bits use for image
+        self.numbits_input = 0
+        # Number of bits output on compression
+        self.numbits_output = 0
+        # Ratio of image (bits in / bits out)
+        self.ratio = 0
+        
+        # Time processing
+        self.time = time.time()
+
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = lz77_coding.tracer()
+
+        self.read()
+        self.toarray()
+
+    def read(self):
+        with self.trace.span("read"):
+            try:
+                self.image = cv2.imread(self.image_path)
+                w, h, c = self.image.shape
+                self.numbits_input = w * h * c * 8
+
+            except:
+                raise Exception("Image Invalid")
+    
+    # convert image into 1D array
+    def toarray(self):
+        w, h, c = self.image.shape
+        with self.trace.span("color"):
+            YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
+        with self.trace.span("flatten"):
+            Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
+
+            Y_array  = Y.reshape((1, w * h))[0]
+            Cr_array = Cr.reshape((1, w * h))[0]
+            Cb_array = Cb.reshape((1, w * h))[0]
+
+            self.array = np.concatenate((Y_array, Cr_array, Cb_array), axis = 0)
+
+    def compress(self):
+        
+        with self.trace.span("match"):
+            # Split array into literals and matches
+            encoder = lz77_coding.encoder(self.level)
+            encoder.encode(self.array.tobytes())
+            flags, *streams = encoder.get_streams()
+            self.numtokens = len(flags)
+
+        with self.trace.span("pack"):
+            # Flags are written as they are, 1 bit for each token
+            self.bitout = lz77_coding.bitOutStream()
+            if self.numtokens > 0:
+                packed = np.packbits(flags).tobytes()
+                self.bitout.write_bits(int.from_bytes(packed, 'big') >> (-self.numtokens % 8), self.numtokens)
+
+        with self.trace.span("encode"):
+            # Literals, lengths and distances are huffman coded, one code each
+            for stream in streams:
+                bitout = lz77_coding.bitOutStream()
+                self.lengths.append(lz77_coding.huffman_encode(stream, bitout))
+                self.streams.append(bitout)
+
+        self.numbits_output = len(self.bitout) + sum(len(s) for s in self.streams)
+        self.numbits_output += 8 * sum(len(l) for l in self.lengths)
+        self.ratio = 1.0 * self.numbits_input / self.numbits_output
+    
+    # write to byte output
+    def write(self):
+        with self.trace.span("serialise"):
+            header = lz77_coding.bitOutStream()
+
+            # shape (w and h) is saved on the container header
+            w, h, c  = self.image.shape
+
+            # - Write level (4bits) and number of tokens
+            #   length_numtokens(6bits) + numtokens(?bits)
+            header.write_bits(self.level, 4)
+            header.write_bits(self.numtokens.bit_length(), 6)
+            header.write_bits(self.numtokens, self.numtokens.bit_length())
+
+            # - For each huffman coded stream: code lengths,
+            #   then its number of bits: length_numbits(6bits) + numbits(?bits)
+            for lengths, stream in zip(self.lengths, self.streams):
+                lz77_coding.huffman_coding.write_lengths(header, lengths)
+                numbits = len(stream)
+                header.write_bits(numbits.bit_length(), 6)
+                header.write_bits(numbits, numbits.bit_length())
+
+        # - Save the container: fixed header (with shape),
+        #   header above as the model section, encoded array as payload
+        with self.trace.span("write"):
+            lz77_coding.write_container(self.output_path, "lz77", (w, h), header, self.bitout, *self.streams)
+
+        self.time = time.time() - self.time
+        print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
+
+
+
+def main(argv):
+    argv, trace_path = lz77_coding.pop_trace_arg(argv)
+    image_path, output_path = argv[:2]
+    level = argv[2] if len(argv) > 2 else 6
+
+    compressor = lz77_compress(image_path, output_path, level)
+    compressor.compress()
+    compressor.write()
+    if trace_path:
+        compressor.trace.dump(trace_path, codec = "lz77", mode = "compress", input = argv[0], output = argv[1])
+    return compressor
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
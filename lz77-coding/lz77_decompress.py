@@ -0,0 +1,148 @@
+import os
+import cv2
+import sys
+import time
+import numpy as np
+import lz77_coding
+
+class lz77_decompress:
+    def __init__(self, encoded_path, image_output_path):
+        
+        self.input_path  = encoded_path
+        self.output_path = image_output_path
+        
+        # bitstream of encoded array
+        self.bitin = None
+
+        # container of the compressed file (memory mapped)
+        self.file = None
+
+        # Image output and shape (w, h)
+        self.image = None
+        self.w = None
+        self.h = None
+        
+        # 1D array
+        self.array = None
+
+        # Effort level used on compression
+        self.level = None
+
+        # Number of tokens (literals and matches)
+        self.numtokens = 0
+
+        # - Code lengths and number of bits of huffman coded streams
+        #   (literals, lengths, distances high byte, low byte)
+        self.lengths = []
+        self.numbits = []
+
+        # Time processing
+        self.time = time.time()
+
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = lz77_coding.tracer()
+
+        self.read()
+
+    # Read from compressed file 
+    def read(self):
+        
+        with self.trace.span("read"):
+            # Open the container (memory mapped), shape is on its header
+            self.file = lz77_coding.container(self.input_path, codec = "lz77")
+            self.w, self.h = self.file.shape
+
+            # Model section: codec parameters and tables
+            self.bitin = self.file.model()
+
+        with self.trace.span("model"):
+            # Read level and number of tokens
+            self.level = self.bitin.read_bits(4)
+            length_numtokens = self.bitin.read_bits(6)
+            self.numtokens   = self.bitin.read_bits(length_numtokens)
+
+            # Read code lengths and number of bits of each stream
+            for _ in range(4):
+                self.lengths.append(lz77_coding.huffman_coding.read_lengths(self.bitin))
+                length_numbits = self.bitin.read_bits(6)
+                self.numbits.append(self.bitin.read_bits(length_numbits))
+
+        # flags and the streams, the payload of container
+        self.bitin = self.file.payload()
+
+    # Covert 1D array into image
+    def toimage(self):
+        w, h = self.w, self.h
+        
+        # Subtract 1D array into 3 sub arrays
+        with self.trace.span("reshape"):
+            Y_array  = self.array[: w*h]
+            Cr_array = self.array[w*h : 2*w*h]
+            Cb_array = self.array[2*w*h : 3*w*h]
+
+            # convert array into 3 channels image
+            Y  = Y_array.reshape((w,h))
+            Cr = Cr_array.reshape((w,h))
+            Cb = Cb_array.reshape((w,h))
+
+            # Create a copy zero image
+            image = np.zeros((w,h,3), dtype = np.uint8)
+            image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
+        
+        # Convert to RGB
+        with self.trace.span("color"):
+            self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
+
+
+    def decompress(self):
+        with self.trace.span("decode"):
+            data = self.bitin.data
+            position = self.bitin.position
+
+            # Flags, 1 bit for each token
+            flags = np.unpackbits(np.frombuffer(data, dtype = np.uint8), count = position + self.numtokens)[position:]
+            position += self.numtokens
+            nummatches = int(np.count_nonzero(flags))
+
+            # - Decode each huffman coded stream, a bitstream
+            #   is limited to the bits of that stream
+            counts = [self.numtokens - nummatches] + [nummatches] * 3
+            streams = []
+            for lengths, numbits, count in zip(self.lengths, self.numbits, counts):
+                bitin = lz77_coding.bitInStream(data, numbits = position + numbits, position = position)
+                streams.append(lz77_coding.huffman_decode(lengths, bitin, count))
+                position += numbits
+            literals, lengths, high, low = streams
+
+            # distances from their high and low bytes
+            distances = ((np.frombuffer(high, dtype = np.uint8).astype(np.int32) << 8) | np.frombuffer(low, dtype = np.uint8)) + 1
+
+            # Rebuild the array of image size from tokens
+            decoder = lz77_coding.decoder(self.w * self.h * 3)
+            decoder.decode(flags.tobytes(), literals, lengths, distances.tolist())
+            self.bitin.close()
+
+            self.array = np.frombuffer(decoder.get_array(), dtype = np.uint8)
+        
+        self.toimage()
+
+    
+    def write(self):
+        with self.trace.span("write"):
+            cv2.imwrite(self.output_path, self.image)
+        self.time = time.time() - self.time
+        print("Input: \'%s\' \tOutput: \'%s\' \tTime: %.2f(s)"%(self.input_path, self.output_path, self.time))
+
+
+def main(argv):
+    argv, trace_path = lz77_coding.pop_trace_arg(argv)
+    input_path, image_path = argv
+    
+    decompressor = lz77_decompress(input_path, image_path)
+    decompressor.decompress()
+    decompressor.write()
+    if trace_path:
+        decompressor.trace.dump(trace_path, codec = "lz77", mode = "decompress", input = argv[0], output = argv[1])
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,74 +1,144 @@
 import os
+import sys
+import array
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from container import container, write_container
+from timing import tracer, pop_trace_arg
 
 
 class lzw_coding:
-    def __init__(self, numbits):
+    def __init__(self, maxbits):
         
-        # - Numbits used for coding, it the bitstring's length
-        #   of dictionary's value
-        self.numbits = numbits
-        self.format_type = "{:0"+ str(numbits) +"b}"
-        # - Initialize dictionary with 256 symbols
-        #   {string : value}
-        #   {"0000 0001" : "0000 0001", "0000 0010" : "0000 0010", ...}
-        self.dict_size = 256
-        self.dict = {}
-        for i in range(256):
-            self.dict["{:08b}".format(i)] = self.format_type.format(i)
+        # - Codes start with 9 bits, the width grows by 1 each time
+        #   dictionary reaches 2^width, up to "maxbits" bits
+        self.maxbits  = maxbits
+        self.max_size = 1 << maxbits
+
+        # - Dictionary starts with 256 single symbols, their codes
+        #   are the symbols themselves (0..255), 256 is the clear code
+        self.clear_code = 256
+        self.reset()
+
+    # reset dictionary to the first 256 symbols (and clear code)
+    def reset(self):
+        self.dict_size = 257
+        self.numbits   = 9
+
+    # after a new code is added, grow the width if dictionary needs it
+    def update_numbits(self):
+        if self.dict_size >= (1 << self.numbits) and self.numbits < self.maxbits:
+            self.numbits += 1
 
 
 class encoder(lzw_coding):
 
-    def __init__(self, numbits, bitout):
-        lzw_coding.__init__(self, numbits)
+    def __init__(self, maxbits, bitout):
+        lzw_coding.__init__(self, maxbits)
         
         # - BitStream writing to output
         self.output = bitout
+
+        # - Dictionary of phrases longer than 1 symbol, a phrase is
+        #   keyed by its prefix code and next symbol, packed in an integer:
+        #   {(prefix_code << 8) | symbol : code}
+        self.dict = {}
         
-        # - String code, to check whether symbol sequence
-        #   is in dictionary or not
-        self.code = ""
+        # - Code of current phrase, to check whether the phrase
+        #   followed by symbol is in dictionary or not
+        self.code = None
+
+        # - Once dictionary is full, compression ratio (symbols in / bits out
+        #   since the last clear) is checked every "check_gap" symbols,
+        #   a clear code is emitted if it drops
+        self.check_gap  = 10000
+        self.checkpoint = self.check_gap
+        self.numsymbols = 0
+        self.numbits_out = 0
+        self.best_ratio = 0.0
+
+    def write(self, code):
+        self.output.write_bits(code, self.numbits)
+        self.numbits_out += self.numbits
 
     def encode(self, symbol):
         
         # If the eof is met
         if symbol == None:
-            self.output.write(self.dict[self.code])
-        else:
-            string_symbol = "{:08b}".format(symbol)
-            self.code += string_symbol
-            # - If code is not in dicionary, add
-            #   and encode the previous one (8 bits behind)
-            if self.code not in self.dict:
-
-                # Add new
-                value = self.format_type.format(self.dict_size)
-                self.dict_size += 1
-                self.dict[self.code] = value
-
-                # decode the old one
-                self.output.write(self.dict[self.code[:-8]])
-                self.code = string_symbol
+            if self.code != None:
+                self.write(self.code)
+            return
+
+        self.numsymbols += 1
+        if self.code == None:
+            self.code = int(symbol)
+            return
+
+        key = (self.code << 8) | int(symbol)
+        code = self.dict.get(key)
+        if code != None:
+            self.code = code
+            return
+
+        # - Phrase is not in dicionary, encode the previous one
+        #   and add the phrase while dictionary is not full
+        self.write(self.code)
+        self.code = int(symbol)
+        if self.dict_size < self.max_size:
+            self.dict[key] = self.dict_size
+            self.dict_size += 1
+            self.update_numbits()
+        elif self.numsymbols >= self.checkpoint:
+            self.checkpoint = self.numsymbols + self.check_gap
+            ratio = self.numsymbols / self.numbits_out
+            if ratio > self.best_ratio:
+                self.best_ratio = ratio
+            else:
+                self.clear()
+
+    # emit clear code and start with an empty dictionary
+    def clear(self):
+        self.write(self.clear_code)
+        self.dict = {}
+        self.reset()
+        self.checkpoint  = self.check_gap
+        self.numsymbols  = 1
+        self.numbits_out = 0
+        self.best_ratio  = 0.0
                 
     def finish(self):
         self.output.close()
         
 
-class decoder:
-    def __init__(self, numbits, bitin):
-        lzw_coding.__init__(self, numbits)
+class decoder(lzw_coding):
+    def __init__(self, maxbits, bitin, length):
+        lzw_coding.__init__(self, maxbits)
         
         # Bitstream input
         self.input = bitin
 
-        # Array encoded
-        self.array = []
-        
-        # Reverse dictionary
-        self.revdict = dict(zip(self.dict.values(), self.dict.keys()))
+        # Array decoded, preallocated with its length
+        self.array  = bytearray(length)
+        self.length = 0
+
+        # - String table as parallel arrays indexed by code:
+        #   prefix (code of the phrase without its last symbol),
+        #   suffix (last symbol), first symbol and length of phrase.
+        #   Codes 0..255 are the single symbols
+        size = min(self.max_size, length + 258)
+        self.prefix = array.array('i', bytes(4 * size))
+        self.suffix = array.array('B', bytes(size))
+        self.first  = array.array('B', bytes(size))
+        self.lengths = array.array('i', bytes(4 * size))
+        for i in range(256):
+            self.suffix[i] = i
+            self.first[i]  = i
+            self.lengths[i] = 1
     
 
-    # - Decode each bitstring with length equal "numbits" on the encodedstring
+    # - Decode every code (with the current width) on the bitstream,
     #   every time decoding, update the dictionary last value, by adding the 
     #   first "character" decoded
     #   Eg: decoding "XYZ" (result is "TOP")
@@ -76,77 +146,76 @@ class decoder:
     #       - step 2: Decode Y, got O, add O into array, change "T?" into "TO",
     #                   and add "O?" into dictionary
     #           ....
+    #   Each phrase is written backward into array, following prefix codes
     def decode(self):
-        # Read numbits string
-        bitstring = self.input.read(self.numbits)
-        
-        if bitstring == None:
-            return None
-
-        code = int(bitstring, 2)
-        
-        # Look at the dictionary and decode
-        key  = self.revdict[bitstring]
-
-        # Update the last value of dictionary
-        if self.dict_size > 256:
-            last_code = self.format_type.format(self.dict_size - 1)
-            self.revdict[last_code] += key[:8]
-        
-        # Modify the key again
-        key = self.revdict[bitstring]
-        
-        # Add new item decoded into dictionary
-        new_code = self.format_type.format(self.dict_size)
-        self.revdict[new_code] = key
-        self.dict_size += 1
-
-        # Append key into array
-        for i in range(0, len(key), 8):
-            self.array.append(int(key[i:i+8], 2))
-    
-        return True
+        prefix, suffix, first, lengths = self.prefix, self.suffix, self.first, self.lengths
+        output = self.array
+
+        data  = self.input.data
+        pos   = self.input.position
+        total = self.input.numbits
+
+        # Accumulator of bits (nacc bits) read from data
+        index = pos >> 3
+        acc   = 0
+        nacc  = 0
+        if pos < total:
+            acc   = data[index] & ((1 << (8 - (pos & 7))) - 1)
+            nacc  = 8 - (pos & 7)
+            index += 1
+
+        # - Code of the last entry, added with its first symbols only,
+        #   the next decoded phrase gives its last symbol
+        last_code = -1
+        i = 0
+        while pos + self.numbits <= total:
+            # Read a code
+            numbits = self.numbits
+            while nacc < numbits:
+                acc = (acc << 64) | int.from_bytes(data[index: index + 8].ljust(8, b'\0'), 'big')
+                index += 8
+                nacc  += 64
+            nacc -= numbits
+            code  = acc >> nacc
+            acc  &= (1 << nacc) - 1
+            pos  += numbits
+
+            # Clear code: start with an empty dictionary
+            if code == self.clear_code:
+                self.reset()
+                last_code = -1
+                continue
+
+            # Update the last value of dictionary
+            if last_code >= 0:
+                suffix[last_code] = first[code]
+
+            # Add new item decoded into dictionary
+            last_code = -1
+            if self.dict_size < self.max_size:
+                last_code = self.dict_size
+                prefix[last_code]  = code
+                first[last_code]   = first[code]
+                lengths[last_code] = lengths[code] + 1
+                self.dict_size += 1
+                self.update_numbits()
+
+            # Write phrase backward into array
+            length = lengths[code]
+            j = i + length - 1
+            while code >= 256:
+                output[j] = suffix[code]
+                code = prefix[code]
+                j -= 1
+            output[j] = code
+            i += length
+
+        self.input.position = pos
+        self.length = i
+        return i
 
     def finish(self):
         self.input.close()
 
     def get_array(self):
-        return self.array
-# Writting to temp file (for better saving memory)
-class bitOutStream:
-    def __init__(self, stringpath):
-        
-        if os.path.exists(stringpath):
-            os.remove(stringpath)
-
-        self.stringpath = stringpath
-        self.stringout = open(stringpath, 'a+')
-
-    # append bitstring into string file
-    def write(self, bitstring):
-        self.stringout.write(str(bitstring))
-
-    # terminate writing
-    def close(self):
-        self.stringout.close()
-
-
-# Reading input bitstream
-class bitInStream:
-    def __init__(self, stringpath):
-        assert os.path.exists(stringpath)
-        self.stringpath = stringpath
-        self.stringin = open(stringpath, 'r')
-
-    def read(self, numbits):
-        bit = self.stringin.read(numbits)
-        if bit == '':
-            return None
-        return bit
-
-    def close(self):
-        self.stringin.close()
-
-
-
-
+        return memoryview(self.array)[: self.length]
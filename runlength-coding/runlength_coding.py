@@ -1,20 +1,32 @@
+import os
+import sys
+import numpy as np
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from timing import tracer, pop_trace_arg
+
+# - Serialisation of symbols and run-lengths ("bits", "varint"),
+#   the index is saved on compressed file, names are on ../common/container.py
+from container import container, write_container, formats
 
 class encoder:
     def __init__(self):
         # array to store symbols and run-length for each one
-        self.symbols = []
-        self.run_length = []
+        self.symbols = np.zeros(0, dtype = np.uint8)
+        self.run_length = np.zeros(0, dtype = np.int64)
     
-    def encode(self, symbol):
-        
-        # Checking if symbol is on the length,
-        # If it on, we add the length of run,
-        # otherwise we create the new run
-        if len(self.symbols) == 0 or symbol != self.symbols[-1]:
-            self.symbols.append(symbol)
-            self.run_length.append(1)
-        else:
-            self.run_length[-1] += 1
+    # - Encode the whole array at once: a run starts on the first
+    #   symbol and where a symbol differs from the previous one
+    #   (np.diff != 0), its length is the gap to the next start
+    def encode(self, array):
+        array = np.asarray(array, dtype = np.uint8)
+        if len(array) == 0:
+            return
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(array)) + 1))
+        self.symbols    = array[starts]
+        self.run_length = np.diff(np.append(starts, len(array)))
 
     def get_symbols(self):
         return self.symbols
@@ -25,12 +37,42 @@ class encoder:
 class decoder:
     def __init__(self):
         # array result
-        self.array = []
+        self.array = np.zeros(0, dtype = np.uint8)
     
-    def decode(self, symbol, length):
-        
-        # add the runlength of symbol into array
-        self.array.extend([symbol] * length)
+    # expand every symbol by its run-length at once into a uint8 array
+    def decode(self, symbols, run_length):
+        self.array = np.repeat(np.asarray(symbols, dtype = np.uint8), run_length)
 
     def get_array(self):
         return self.array
+
+
+# - LEB128 varints of an array of non negative integers, all at once:
+#   number of bytes of each value, then every byte is taken out of its value
+def varint_encode(values):
+    values = np.asarray(values, dtype = np.uint64)
+    numbytes = np.ones(len(values), dtype = np.int64)
+    for k in range(1, 10):
+        numbytes += values >= np.uint64(1 << (7 * k))
+
+    owner = np.repeat(np.arange(len(values)), numbytes)
+    starts = np.cumsum(numbytes) - numbytes
+    index = np.arange(len(owner)) - starts[owner]
+
+    out = (values[owner] >> (7 * index).astype(np.uint64)) & np.uint64(0x7f)
+    out |= (index < numbytes[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return out.astype(np.uint8).tobytes()
+
+# - Parse LEB128 varints filling the whole data: a value ends
+#   on each byte with high bit clear, its bytes are summed by np.add.reduceat
+def varint_decode(data):
+    data = np.frombuffer(data, dtype = np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype = np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    index = np.arange(len(owner)) - starts[owner]
+
+    parts = (data[: len(owner)] & 0x7f).astype(np.uint64) << (7 * index).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
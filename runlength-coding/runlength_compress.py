@@ -2,12 +2,11 @@ import numpy as np
 import cv2
 import time
 import sys
-import pickle
 
 import runlength_coding
 
 class runlength_compress:
-    def __init__(self, image_path, output_path):
+    def __init__(self, image_path, output_path, format = "varint"):
         
         self.image_path  = image_path
         self.output_path = output_path
@@ -22,6 +21,15 @@ class runlength_compress:
         self.symbols = []
         self.run_length = []
 
+        # - Serialisation of symbols and run-lengths: "varint" (byte aligned)
+        #   or "bits" (5bits length + bits for each run-length)
+        if format not in runlength_coding.formats:
+            raise ValueError("Format must be one of %s" % ", ".join(runlength_coding.formats))
+        self.format = format
+
+        # bitstream of symbols and run-lengths
+        self.bitout = None
+
         # number of bits using to store image
         self.numbits_input  = 0
         # number of bits using to store output
@@ -31,34 +39,40 @@ class runlength_compress:
         self.ratio = None
         
         # time processing
-        self.time = 0
+        self.time = time.time()
+
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = runlength_coding.tracer()
 
         self.read()
         self.toarray()
 
     # Read image to input
     def read(self):
-        try:
-            self.image = cv2.imread(self.image_path)
-            w, h, c = self.image.shape
-            self.numbits_input = w * h * c * 8
-        except:
-            raise Exception("Image Invalid")
+        with self.trace.span("read"):
+            try:
+                self.image = cv2.imread(self.image_path)
+                w, h, c = self.image.shape
+                self.numbits_input = w * h * c * 8
+            except:
+                raise Exception("Image Invalid")
     
 
     # convert image into zigzag array
     def toarray(self):
         w, h, _ = self.image.shape
-        YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
+        with self.trace.span("color"):
+            YCrCb = cv2.cvtColor(self.image, cv2.COLOR_BGR2YCrCb)
         
-        Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
+        with self.trace.span("flatten"):
+            Y, Cr, Cb = YCrCb[:, :, 0], YCrCb[:, :, 1], YCrCb[:, :, 2]
 
-        # create 1D array
-        Y_array  = Y.reshape((1,w*h))[0]
-        Cr_array = Cr.reshape((1,w*h))[0]
-        Cb_array = Cb.reshape((1,w*h))[0]
+            # create 1D array
+            Y_array  = Y.reshape((1,w*h))[0]
+            Cr_array = Cr.reshape((1,w*h))[0]
+            Cb_array = Cb.reshape((1,w*h))[0]
 
-        self.array = list(np.concatenate((Y_array, Cr_array, Cb_array), axis = 0))
+            self.array = np.concatenate((Y_array, Cr_array, Cb_array), axis = 0)
 
     
     # Modify symbols and run_length array for better compress,
@@ -66,106 +80,89 @@ class runlength_compress:
     # simple delete any run-length = 1 in run_length array,
     # and double any symbol has run-length >= 2
     def modify_compress(self):
-        # new_symbols and new_runlength
-        new_symbols   = []
-        new_runlength = []
-        for symbol, runlength in zip(self.symbols, self.run_length):
-            if runlength >= 2:
-                new_symbols.extend([symbol, symbol])
-                new_runlength.append(runlength)
-            else:
-                new_symbols.append(symbol)
-        
-        self.symbols   = new_symbols
-        self.run_length = new_runlength
+        double = self.run_length >= 2
+        self.symbols    = np.repeat(self.symbols, np.where(double, 2, 1))
+        self.run_length = self.run_length[double]
 
 
     def compress(self):
-        t = time.time()
-
-        model = runlength_coding.encoder()
-        leng_array = len(self.array)
-        percent = 0
-        for i, symbol in enumerate(self.array):
-            if i * 100.0 / leng_array > percent:
-                percent += 1
-                sys.stdout.write("Processing:\t{} % \r".format(percent))
-                sys.stdout.flush()
-            model.encode(symbol)
-        print('')
-        self.symbols    = model.get_symbols()
-        self.run_length = model.get_run_length()
-
-        self.modify_compress()
-
-        self.numbits_output = len(self.symbols) * 8 + len(self.run_length) * 8
-        self.ratio = self.numbits_input * 1.0 / self.numbits_output
+        with self.trace.span("encode"):
+            # find every run on the whole array at once
+            model = runlength_coding.encoder()
+            model.encode(self.array)
+            self.symbols    = model.get_symbols()
+            self.run_length = model.get_run_length()
+
+            self.modify_compress()
+
+        with self.trace.span("pack"):
+            # serialise symbols and run_length arrays
+            if self.format == "varint":
+                self.serialise_varint()
+            else:
+                self.serialise_bits()
 
-        self.time = time.time() - t
+        self.numbits_output = len(self.bitout)
+        self.ratio = self.numbits_input * 1.0 / self.numbits_output
     
-    # write symbols and run_length array into a byte file
-    def write(self):
-        encoded_text = ""
-
-        # Convert image shape into str, it has structure
-        # length_of_w_bitstring (5bits) + w_bitstring (? bits) +
-        # + length_of_h_bitstring (5bits) + h_bitstring (? bits)
-        w, h , _  = self.image.shape
-        w_string  = '{:b}'.format(w)
-        h_string  = '{:b}'.format(h)
-        length_w  = '{:05b}'.format(len(w_string))
-        length_h  = '{:05b}'.format(len(h_string))
-        # save them as string
-        shape_text = length_w + w_string + length_h + h_string
-
-        # Convert symbols array into string
+    # - Byte aligned: number of symbols (varint) + symbols (1 byte each)
+    #   + run_length - 2 (varints, as every stored run is 2 or longer)
+    def serialise_varint(self):
+        self.bitout = runlength_coding.bitOutStream()
+        self.bitout.write_bytes(runlength_coding.varint_encode([len(self.symbols)]))
+        self.bitout.write_bytes(self.symbols.tobytes())
+        self.bitout.write_bytes(runlength_coding.varint_encode(self.run_length - 2))
+
+    def serialise_bits(self):
+        self.bitout = runlength_coding.bitOutStream()
+
+        # Write symbols array into bitstream
         # structure: length_of_length_symbol(5bits) + length_symbols (? bits) + 
         # + symbol[0] + symbol[1] + ...
-        length_symbols   = '{:b}'.format(len(self.symbols))
-        length_of_length = '{:05b}'.format(len(length_symbols))
-        symbols_text = length_of_length + length_symbols
-        # Save symbol into symbols text
-        for symbol in self.symbols:
-            symbols_text += '{:08b}'.format(symbol)
-
-        # Convert run_length into string
+        length_symbols = len(self.symbols)
+        self.bitout.write_bits(length_symbols.bit_length(), 5)
+        self.bitout.write_bits(length_symbols, length_symbols.bit_length())
+        # Save symbols into bitstream, 8 bits each
+        if length_symbols > 0:
+            self.bitout.write_bits(int.from_bytes(self.symbols.tobytes(), 'big'), 8 * length_symbols)
+
+        # Write run_length into bitstream
         # stuturce: length_of_length_run (5bits) + length_run (? bits) + ....
-        runlength_text = ""
-        for runlength in self.run_length:
-            length_run       = '{:b}'.format(runlength)
-            length_of_length = '{:05b}'.format(len(length_run))
-            runlength_text += length_of_length + length_run
-
-        # Combine to a text
-        encoded_text = shape_text + symbols_text + runlength_text
-
-        # Add some "0" into encoded_text so it can devide by 8,
-        # so we can save that text to a bytearray
-        leng_text = len(encoded_text)
-        num_zero  = 8 - leng_text % 8
-        # add num_zero to 8 bits to easily get back when decompressing
-        encoded_text += '{:08b}'.format(num_zero)
-        encoded_text  = "0" * num_zero + encoded_text
-
-        # Create byte array and add every 8bits in
-        # encoded_text into this byte array
-        b = bytearray()
-        for i in range(0, leng_text + num_zero + 8, 8):
-            b.append(int(encoded_text[i: i + 8], 2))
-
-        # Write byte array to output
-        with open(self.output_path, 'wb') as f:
-            pickle.dump(b, f)
-            print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
+        for runlength in self.run_length.tolist():
+            self.bitout.write_bits(runlength.bit_length(), 5)
+            self.bitout.write_bits(runlength, runlength.bit_length())
+
+    # write symbols and run_length array into a byte file
+    def write(self):
+        with self.trace.span("serialise"):
+            encoded = runlength_coding.bitOutStream()
+
+            # image shape (w, h) is saved on the container header
+            w, h , _  = self.image.shape
+
+            # - Write format (8bits) into the model section, payload
+            #   of container starts on a byte so varints stay aligned on file
+            encoded.write_bits(runlength_coding.formats.index(self.format), 8)
+
+        # Write container: header, model section and payload
+        with self.trace.span("write"):
+            runlength_coding.write_container(self.output_path, "runlength", (w, h), encoded, self.bitout)
+        self.time = time.time() - self.time
+        print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(self.image_path, self.output_path,self.numbits_input, self.numbits_output, self.ratio, self.time))
 
 
 def main(argv):
+    argv, trace_path = runlength_coding.pop_trace_arg(argv)
     
-    image, output = argv
+    image, output = argv[:2]
+    format = argv[2] if len(argv) > 2 else "varint"
 
-    compressor = runlength_compress(image, output)
+    compressor = runlength_compress(image, output, format)
     compressor.compress()
     compressor.write()
+    if trace_path:
+        compressor.trace.dump(trace_path, codec = "runlength", mode = "compress", input = argv[0], output = argv[1])
+    return compressor
 
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -2,7 +2,6 @@ import sys
 import cv2
 import time
 import numpy as np
-import pickle
 
 import runlength_coding
 
@@ -20,86 +19,97 @@ class runlength_decompress:
         # image shape
         self.w = None
         self.h = None
+
+        # container of the compressed file (memory mapped)
+        self.file = None
         
         # symbols and runlength_array
         self.symbols = []
         self.run_length = []
+
+        # serialisation of symbols and run-lengths ("varint" or "bits")
+        self.format = None
         
         # time processing
         self.time = time.time()
 
+        # Timing of each stage (spans), see common/timing.py
+        self.trace = runlength_coding.tracer()
+
         self.read()
         self.reconstruct()
 
     # Read a compress file and extract them into
     # image shape, symbols, run_length array
     def read(self):
-        # load
-        with open(self.input_path, 'rb') as f:
-            bytearr = pickle.load(f)
-
-        # write byte array into text
-        encoded_text = ""
-        for byte in bytearr:
-            encoded_text += '{:08b}'.format(byte)
-
-        # delete some "0" at the first
-        num_zero = int(encoded_text[-8:], 2)
-        encoded_text = encoded_text[num_zero: -8]
-
-        # extract shape: (w, h)
-        length_w = int(encoded_text[:5], 2)
-        self.w   = int(encoded_text[5: 5 + length_w], 2)
-        length_h = int(encoded_text[5 + length_w: 10 + length_w], 2)
-        self.h   = int(encoded_text[10 + length_w: 10 + length_w + length_h], 2)
-        encoded_text = encoded_text[10 + length_w + length_h: ]
+        with self.trace.span("read"):
+            # open the container (memory mapped), shape is on its header
+            self.file = runlength_coding.container(self.input_path, codec = "runlength")
+            self.w, self.h = self.file.shape
+
+            # extract format from model section
+            self.format = runlength_coding.formats[self.file.model().read_bits(8)]
+
+        with self.trace.span("parse"):
+            # symbols and run-lengths, the payload of container
+            bitin = self.file.payload()
+            if self.format == "varint":
+                self.parse_varint(bitin)
+            else:
+                self.parse_bits(bitin)
+
+    # - Byte aligned: number of symbols (varint) + symbols (1 byte each)
+    #   + run_length - 2 (varints) up to the end
+    def parse_varint(self, bitin):
+        data = bitin.data[bitin.position >> 3: bitin.numbits >> 3]
 
+        # number of symbols, the first varint
+        length_symbols = 0
+        i = 0
+        while True:
+            length_symbols |= (data[i] & 0x7f) << (7 * i)
+            i += 1
+            if data[i - 1] < 0x80:
+                break
+
+        self.symbols    = np.frombuffer(data, dtype = np.uint8, count = length_symbols, offset = i)
+        self.run_length = runlength_coding.varint_decode(data[i + length_symbols:]).astype(np.int64) + 2
+
+    def parse_bits(self, bitin):
         # extract symbols array
-        length_of_length = int(encoded_text[: 5], 2)
-        length_symbols   = int(encoded_text[5: 5 + length_of_length], 2)
-        encoded_text = encoded_text[5 + length_of_length: ]
-        for i in range(0, length_symbols * 8, 8):
-            self.symbols.append(int(encoded_text[i: i + 8], 2))
-        encoded_text = encoded_text[length_symbols * 8:]
+        length_of_length = bitin.read_bits(5)
+        length_symbols   = bitin.read_bits(length_of_length)
+        # all symbols are read at once, 8 bits each
+        if length_symbols > 0:
+            value = bitin.read_bits(8 * length_symbols)
+            self.symbols = np.frombuffer(value.to_bytes(length_symbols, 'big'), dtype = np.uint8)
 
         # extract run_length array
-        leng_text = len(encoded_text)
-        i = 0
-        while i < leng_text:
-            length_of_length = int(encoded_text[i: i + 5], 2)
-            length_run       = int(encoded_text[i + 5: i + 5 + length_of_length], 2)
+        while bitin.remaining() > 0:
+            length_of_length = bitin.read_bits(5)
+            length_run       = bitin.read_bits(length_of_length)
             self.run_length.append(length_run)
-            i = i + 5 + length_of_length
 
     # Reconstruct symbols and run_length array into simple one
     # 3AA2BBC into 3A2B1C
     def reconstruct(self):
-        new_symbols   = []
-        new_runlength = []
-        
-        # Traverse on symbols array, if an element is doubled, add
-        # it into new symbols and add runlength into new runlength array
-        # otherwise add 1 into new runlength
-        leng_symbols = len(self.symbols)
-        i, j = 0, 0
-        while i < leng_symbols - 1:
-            if self.symbols[i] == self.symbols[i + 1]:
-                new_symbols.append(self.symbols[i])
-                new_runlength.append(self.run_length[j])
-                i = i + 1
-                j = j + 1
-            else:
-                new_symbols.append(self.symbols[i])
-                new_runlength.append(1)
-            i = i + 1
-        
-        # Add last symbol
-        if i == leng_symbols - 1:
-            new_symbols.append(self.symbols[i])
-            new_runlength.append(1)
+        with self.trace.span("model"):
+            symbols = np.asarray(self.symbols, dtype = np.uint8)
+
+            # - A doubled symbol (equal to the next one) starts a run
+            #   with length from run_length array, its second copy is dropped,
+            #   other symbols have runlength 1. Two runs next to each other
+            #   never have the same symbol, so doubled pairs never overlap
+            double = np.zeros(len(symbols), dtype = bool)
+            double[:-1] = symbols[:-1] == symbols[1:]
+            keep = np.ones(len(symbols), dtype = bool)
+            keep[1:] = ~double[:-1]
+
+            new_runlength = np.ones(len(symbols), dtype = np.int64)
+            new_runlength[double] = self.run_length
 
-        self.symbols    = new_symbols
-        self.run_length = new_runlength
+            self.symbols    = symbols[keep]
+            self.run_length = new_runlength[keep]
 
         assert len(self.symbols) == len(self.run_length)
 
@@ -108,48 +118,45 @@ class runlength_decompress:
         w, h = self.w, self.h
         
         # 1D array
-        Y_array  = self.array[: w*h]
-        Cr_array = self.array[w*h: 2*w*h]
-        Cb_array = self.array[2*w*h: 3*w*h]
-
-        # reshape into (w,h) matrix
-        Y  = np.array(Y_array).reshape((w,h))
-        Cr = np.array(Cr_array).reshape((w,h))
-        Cb = np.array(Cb_array).reshape((w,h))
-
-        # create image
-        image = np.zeros((w,h,3), dtype=np.uint8)
-        image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
-        self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
+        with self.trace.span("reshape"):
+            Y_array  = self.array[: w*h]
+            Cr_array = self.array[w*h: 2*w*h]
+            Cb_array = self.array[2*w*h: 3*w*h]
+
+            # reshape into (w,h) matrix
+            Y  = Y_array.reshape((w,h))
+            Cr = Cr_array.reshape((w,h))
+            Cb = Cb_array.reshape((w,h))
+
+            # create image
+            image = np.zeros((w,h,3), dtype=np.uint8)
+            image[:, :, 0], image[:, :, 1], image[:, :, 2] = Y, Cr, Cb
+        with self.trace.span("color"):
+            self.image = cv2.cvtColor(image, cv2.COLOR_YCrCb2BGR)
 
     def decompress(self):
-        model = runlength_coding.decoder()
-        leng_array = len(self.symbols)
-        percent = 0
-        i = 0
-        for symbol, length in zip(self.symbols, self.run_length):
-            if i * 100.0 / leng_array > percent:
-                percent += 1
-                sys.stdout.write("Processing:\t{} % \r".format(percent))
-                sys.stdout.flush()
-
-            model.decode(symbol, length)
-            i += 1
-        print('')
-        self.array = model.get_array()
+        with self.trace.span("decode"):
+            # expand every run at once
+            model = runlength_coding.decoder()
+            model.decode(self.symbols, self.run_length)
+            self.array = model.get_array()
         self.toimage()
 
     def write(self):
-        cv2.imwrite(self.output_path, self.image)
+        with self.trace.span("write"):
+            cv2.imwrite(self.output_path, self.image)
         self.time = time.time() - self.time
         print("Input: \'%s\' \tOutput: \'%s\' \tTime: %.2f(s)"%(self.input_path, self.output_path, self.time))
 
 def main(argv):
+    argv, trace_path = runlength_coding.pop_trace_arg(argv)
     compressed, image_path = argv
 
     decompressor = runlength_decompress(compressed, image_path)
     decompressor.decompress()
     decompressor.write()
+    if trace_path:
+        decompressor.trace.dump(trace_path, codec = "runlength", mode = "decompress", input = argv[0], output = argv[1])
 
 if __name__ == "__main__":
     main(sys.argv[1:])
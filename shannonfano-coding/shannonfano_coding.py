@@ -1,4 +1,16 @@
 import os
+import sys
+import bisect
+import numpy as np
+
+# Shared bit streams live in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+from bitstream import bitOutStream, bitInStream
+from container import container, write_container
+from timing import tracer, pop_trace_arg
+from codebook import codeBook
+from frequencies import first_occurrence
+from prefixtable import prefixTable
 
 # - Node of Tree to create shannon-fano tree
 class node:
@@ -38,6 +50,13 @@ class sfTree:
         # symbol of frequency table
         self.symbols = list(freqs.keys())
 
+        # - Cumulative frequencies, cumfreqs[i] is the sum of
+        #   frequencies of symbols[0: i], so weight of symbols[start: end]
+        #   is cumfreqs[end] - cumfreqs[start]
+        self.cumfreqs = [0]
+        for symbol in self.symbols:
+            self.cumfreqs.append(self.cumfreqs[-1] + self.freqs[symbol])
+
         # Dictionary of sfTree use for coding
         self.codewords = {}
         
@@ -45,49 +64,51 @@ class sfTree:
         self.update()
 
 
+    # - Balance point of symbols[start: end]: the first m that
+    #   weight of symbols[start: m] is more than half of the weight,
+    #   found by binary search on cumulative frequencies.
+    #   Both sides keep at least 1 symbol
+    def split(self, start, end):
+        half = (self.cumfreqs[end] - self.cumfreqs[start]) // 2
+        m = bisect.bisect_right(self.cumfreqs, self.cumfreqs[start] + half, start, end + 1)
+        return min(max(m, start + 1), end - 1)
+
     # - Create children of a current node
-    #   with symbol is in symbols[start: end]
+    #   with symbol is in symbols[start: end],
+    #   then their children, with a stack instead of recursion
     def add_children(self, cur, start, end):
-        # Get m so that symbols[start: m] near to symbols[m: end]
-        m = start
-        sum_left = 0
-        sum_right = cur.weight
-        while m < end:
-            if sum_left > sum_right:
-                break
+        cumfreqs = self.cumfreqs
+        stack = [(cur, start, end)]
+        while stack:
+            cur, start, end = stack.pop()
+            m = self.split(start, end)
+
+            # Create the children node
+            cur.left  = node(weight = cumfreqs[m] - cumfreqs[start], code = cur.code + "0")
+            cur.right = node(weight = cumfreqs[end] - cumfreqs[m], code = cur.code + "1")
+
+            # - If a child has only 1 element we update the codewords,
+            #   otherwise its children are added later
+            if m - start == 1:
+                self.codewords[self.symbols[start]] = cur.left.code
             else:
-                sum_left  += self.freqs[self.symbols[m]]
-                sum_right -= self.freqs[self.symbols[m]]
-                m += 1
-
-        # fix infinite recursion
-        if end - start == 2:
-            m = start + 1
-            sum_left = self.freqs[self.symbols[start]]
-            sum_right = self.freqs[self.symbols[start + 1]]
-
-        # Create the children node
-        cur.left  = node(weight = sum_left , code = cur.code + "0")
-        cur.right = node(weight = sum_right, code = cur.code + "1")
-        
-        # - If cur.left have only 1 element (m - start = 1)
-        #   we update the codewords, otherwise we add child into left
-        if m - start == 1:
-            self.codewords[self.symbols[start]] = cur.left.code
-        else:
-            self.add_children(cur.left, start, m)
+                stack.append((cur.left, start, m))
 
-        # Doing the same on right node
-        if end - m == 1:
-            self.codewords[self.symbols[m]] = cur.right.code
-        else:
-            self.add_children(cur.right, m, end)
+            if end - m == 1:
+                self.codewords[self.symbols[m]] = cur.right.code
+            else:
+                stack.append((cur.right, m, end))
         
 
     # Generate codewords
     def update(self):
-        self.root.weight = sum(list(self.freqs.values()))
-        self.add_children(self.root, 0, len(self.symbols))
+        self.root.weight = self.cumfreqs[-1]
+
+        # Only one symbol, it is coded with 1 bit
+        if len(self.symbols) == 1:
+            self.codewords[self.symbols[0]] = "0"
+        elif len(self.symbols) > 1:
+            self.add_children(self.root, 0, len(self.symbols))
     
     def get_codewords(self):
         return self.codewords
@@ -98,52 +119,50 @@ class encoder:
         
         # Codewords create by sfTree
         self.codewords = codewords
+
+        # Code and length arrays of codewords, indexed by symbol
+        self.codebook = codeBook(codewords)
         
-        # Bitout stream to write to a file,
-        # for better memory saving only
+        # Bitout stream to write packed bits
         self.output = bitout
 
-    def encode(self, symbol):
-        if symbol in self.codewords:
-            self.output.write(self.codewords[symbol])
+    # encode the whole array of symbols at once
+    def encode(self, array):
+        self.codebook.encode(np.asarray(array, dtype = np.uint8), self.output)
     
     def finish(self):
         self.output.close()
 
 class decoder:
-    def __init__(self, codewords, bitin):
+    def __init__(self, codewords, bitin, length, numbits = 11):
 
         # codewords create by sfTree
         self.codewords = codewords
         
-        # reverse codewords:
-        self.rev_codewords = dict(zip(codewords.values(), codewords.keys()))
+        # - Lookup table of codewords, consuming "numbits" bits
+        #   at once, symbols are changed into bytes
+        table_codewords = {bytes([int(key)]): code for key, code in codewords.items()}
+        self.table = prefixTable(table_codewords, numbits)
 
         # Bitstream file encoded by codewords
         self.input = bitin
         
-        # current value
-        self.value = ""
-        
-        # array decoded
-        self.array = []
+        # array decoded, preallocated with length of array
+        self.array  = bytearray(length)
+        self.length = 0
 
 
+    # decode the whole bitstream into array
     def decode(self):
-        bit = self.input.read()
-        if bit == None:
-            return None
-        self.value += bit
-        if self.value in self.rev_codewords:
-            self.array.append(self.rev_codewords[self.value])
-            self.value = ""    
-        return 1
+        self.length = self.table.decode(self.input, self.array)
+        return self.length
 
     def finish(self):
         self.input.close()
 
+    # decoded symbols as a uint8 array
     def get_array(self):
-        return self.array
+        return np.frombuffer(self.array, dtype = np.uint8)[: self.length]
 
 # table of frequencies create from an array
 class freqTable:
@@ -154,58 +173,18 @@ class freqTable:
         
         self.make_freqs()
 
-    # Make frequencies table
+    # - Make frequencies table: symbols counted at once (np.bincount),
+    #   sorted by frequency, ties in order of first occurrence
     def make_freqs(self):
         if len(self.freqs) == 0:
-            for key in self.array:
-                if key not in self.freqs:
-                    self.freqs[key]  = 1
-                else:
-                    self.freqs[key] += 1
-        
-        _sorted = sorted(self.freqs.items(), key = lambda x: x[1], reverse = True)
-
-        keys    = [x[0] for x in _sorted]
-        values  = [x[1] for x in _sorted]
-
-        self.freqs = dict(zip(keys, values))
+            array  = np.asarray(self.array, dtype = np.uint8)
+            counts = np.bincount(array, minlength = 256)
+            first  = first_occurrence(array, np.count_nonzero(counts))
+            keys   = sorted(first, key = lambda key: (-counts[key], first[key]))
+            self.freqs = {key: int(counts[key]) for key in keys}
+        else:
+            _sorted = sorted(self.freqs.items(), key = lambda x: x[1], reverse = True)
+            self.freqs = dict(_sorted)
     
     def get_freqs(self):
         return self.freqs
-
-
-# Writting to temp file (for better saving memory)
-class bitOutStream:
-    def __init__(self, stringpath):
-        
-        if os.path.exists(stringpath):
-            os.remove(stringpath)
-
-        self.stringpath = stringpath
-        self.stringout = open(stringpath, 'a+')
-
-    # append bitstring into string file
-    def write(self, bitstring):
-        self.stringout.write(str(bitstring))
-
-    # terminate writing
-    def close(self):
-        self.stringout.close()
-
-
-# Reading input bitstream
-class bitInStream:
-    def __init__(self, stringpath):
-        assert os.path.exists(stringpath)
-        self.stringpath = stringpath
-        self.stringin = open(stringpath, 'r')
-
-    def read(self):
-        bit = self.stringin.read(1)
-        if bit == '':
-            return None
-        return bit
-
-    def close(self):
-        self.stringin.close()
-
@@ -0,0 +1,114 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Codec ids live in ../common/container.py
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(_root, 'common'))
+from container import codecs
+
+# extensions of images taken from a directory
+extensions = (".jpeg", ".jpg", ".png", ".bmp", ".tif", ".tiff")
+
+# - Compress module of the worker, imported once by init_worker,
+#   so cv2 / numpy and the codec are loaded once for every file
+_module = None
+
+def init_worker(codec):
+    global _module
+    sys.path.insert(0, os.path.join(_root, codec + '-coding'))
+    _module = importlib.import_module(codec + '_compress')
+
+    # progress and result lines of compressors are not shown,
+    # results are sent back to the main process
+    sys.stdout = open(os.devnull, 'w')
+
+# - Compress one image on a worker,
+#   return its result as a dict (with "error" if it fails)
+def compress_file(image_path, output_path, options):
+    t = time.time()
+    try:
+        compressor = _module.main([image_path, output_path] + list(options))
+    except Exception as e:
+        return {"input": image_path, "error": "%s: %s" % (type(e).__name__, e)}
+    return {
+        "input"          : image_path,
+        "output"         : output_path,
+        "numbits_input"  : compressor.numbits_input,
+        "numbits_output" : compressor.numbits_output,
+        "ratio"          : compressor.ratio,
+        "time"           : time.time() - t,
+    }
+
+# images of a directory, or of a glob pattern
+def find_images(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith(extensions)]
+    else:
+        paths = glob.glob(source)
+    return sorted(paths)
+
+
+def batch_compress(codec, source, output_dir, workers = None, options = ()):
+    if codec not in codecs:
+        raise ValueError("Codec must be one of %s" % ", ".join(codecs))
+    images = find_images(source)
+
+    # - Images of a glob may come from several directories,
+    #   two of them with the same name would write one output
+    names = [os.path.basename(path) for path in images]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise ValueError("Several images named %s, outputs would overwrite each other" % ", ".join(duplicates))
+    os.makedirs(output_dir, exist_ok = True)
+
+    t = time.time()
+    total_input  = 0
+    total_output = 0
+    numfailed = 0
+
+    # - Shard files across the pool, results are printed
+    #   as soon as each file is done
+    with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (codec,)) as pool:
+        futures = []
+        for image_path in images:
+            # extension is kept, so "small.jpg" and "small.png" do not collide
+            output_path = os.path.join(output_dir, os.path.basename(image_path) + ".bin")
+            futures.append(pool.submit(compress_file, image_path, output_path, options))
+
+        for future in as_completed(futures):
+            result = future.result()
+            if "error" in result:
+                numfailed += 1
+                print("Input: \'%s\'\tError: %s" % (result["input"], result["error"]))
+                continue
+            total_input  += result["numbits_input"]
+            total_output += result["numbits_output"]
+            print("Input: \'%s\'\tOutput: \'%s\'\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(result["input"], result["output"], result["numbits_input"], result["numbits_output"], result["ratio"], result["time"]))
+            sys.stdout.flush()
+
+    elapsed = time.time() - t
+    ratio = total_input * 1.0 / total_output if total_output else 0.0
+    print("Files: %d\tFailed: %d\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(len(images), numfailed, total_input, total_output, ratio, elapsed))
+    return {"files": len(images), "failed": numfailed, "numbits_input": total_input,
+            "numbits_output": total_output, "ratio": ratio, "time": elapsed}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Compress every image of a directory or glob")
+    parser.add_argument("codec", choices = codecs)
+    parser.add_argument("source", help = "directory or glob pattern, eg: \"images/sample*.jpeg\"")
+    parser.add_argument("output_dir")
+    parser.add_argument("-j", "--workers", type = int, default = None, help = "number of processes (default: number of cores)")
+    parser.add_argument("options", nargs = "*", help = "options of the codec, as on its compress script")
+    args = parser.parse_intermixed_args(argv)
+
+    batch_compress(args.codec, args.source, args.output_dir, args.workers, args.options)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,212 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+
+# - Benchmark of every codec over images/sample*.jpeg and the images
+#   of each codec directory (dog.jpeg, flower.jpeg, night.jpeg).
+#   Each compress / decompress runs on its own process, so its
+#   peak memory (max RSS) is measured alone
+_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# - Cases: name -> (codec, options of its compress script)
+cases = {
+    "huffman"          : ("huffman", ["1"]),
+    "huffman-k2"       : ("huffman", ["2"]),
+    "huffman-k3"       : ("huffman", ["3"]),
+    "arithmetic"       : ("arithmetic", ["arithmetic", "static"]),
+    "arithmetic-range" : ("arithmetic", ["range", "static"]),
+    "lzw"              : ("lzw", []),
+    "lz77"             : ("lz77", []),
+    "runlength"        : ("runlength", []),
+    "shannonfano"      : ("shannonfano", []),
+    "ans"              : ("ans", []),
+}
+
+
+# - Run one stage in this process (called on a child process):
+#   import the script module, run its main with stdout silenced,
+#   write the elapsed time as JSON into result_path
+def run_stage(result_path, codec, stage, argv):
+    sys.path.insert(0, os.path.join(_root, codec + '-coding'))
+    module = __import__(codec + '_' + stage)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    t = time.perf_counter()
+    module.main(argv)
+    elapsed = time.perf_counter() - t
+    sys.stdout = stdout
+    with open(result_path, 'w') as f:
+        json.dump({"time": elapsed}, f)
+
+# - Run one stage on a child process,
+#   return (elapsed time, peak RSS in bytes), None if it fails.
+#   Output of the child is discarded (no pipe to fill up while
+#   waiting), its result comes back through a file
+def spawn_stage(codec, stage, argv, timeout, workdir):
+    result_path = os.path.join(workdir, "result.json")
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    command = [sys.executable, os.path.abspath(__file__), "--stage", result_path, codec, stage] + argv
+    child = subprocess.Popen(command, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    t = time.time()
+    while True:
+        pid, status, rusage = os.wait4(child.pid, os.WNOHANG)
+        if pid != 0:
+            break
+        if timeout and time.time() - t > timeout:
+            child.kill()
+            os.wait4(child.pid, 0)
+            return None
+        time.sleep(0.01)
+
+    if status != 0 or not os.path.exists(result_path):
+        return None
+    with open(result_path) as f:
+        elapsed = json.load(f)["time"]
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = rusage.ru_maxrss * (1 if platform.system() == "Darwin" else 1024)
+    return elapsed, peak
+
+
+# - Round trip check: decoded image equals the original
+#   after the YCrCb conversion (the only lossy step)
+def check_roundtrip(image_path, decoded_path):
+    import cv2
+    original = cv2.imread(image_path)
+    decoded  = cv2.imread(decoded_path)
+    if decoded is None or decoded.shape != original.shape:
+        return False
+    expected = cv2.cvtColor(cv2.cvtColor(original, cv2.COLOR_BGR2YCrCb), cv2.COLOR_YCrCb2BGR)
+    return bool((expected == decoded).all())
+
+
+def bench_case(name, image_path, workdir, timeout):
+    import cv2
+    codec, options = cases[name]
+    w, h, c = cv2.imread(image_path).shape
+    megabytes = w * h * c / 1e6
+
+    encoded = os.path.join(workdir, "encoded.bin")
+    decoded = os.path.join(workdir, "decoded.png")
+    for path in (encoded, decoded):
+        if os.path.exists(path):
+            os.remove(path)
+
+    result = {"case": name, "image": os.path.relpath(image_path, _root), "size": w * h * c}
+    compressed = spawn_stage(codec, "compress", [image_path, encoded] + options, timeout, workdir)
+    if compressed is None:
+        result["error"] = "compress failed"
+        return result
+    decompressed = spawn_stage(codec, "decompress", [encoded, decoded], timeout, workdir)
+    if decompressed is None:
+        result["error"] = "decompress failed"
+        return result
+
+    result.update({
+        "ratio"            : w * h * c * 1.0 / os.path.getsize(encoded),
+        "compress_mbs"     : megabytes / compressed[0],
+        "decompress_mbs"   : megabytes / decompressed[0],
+        "compress_time"    : compressed[0],
+        "decompress_time"  : decompressed[0],
+        "compress_rss"     : compressed[1],
+        "decompress_rss"   : decompressed[1],
+        "roundtrip"        : check_roundtrip(image_path, decoded),
+    })
+    return result
+
+# images of a case: the samples and the images of its codec directory
+def case_images(name, patterns):
+    codec = cases[name][0]
+    paths = []
+    for pattern in patterns:
+        paths.extend(glob.glob(os.path.join(_root, pattern.replace("{codec}", codec))))
+    return sorted(set(paths))
+
+
+# - Compare results with a saved baseline, a case is a regression
+#   when it is slower than threshold (fraction) or its ratio dropped
+def compare(results, baseline, threshold):
+    old = {(r["case"], r["image"]): r for r in baseline["results"] if "error" not in r}
+    regressions = 0
+    for r in results:
+        key = (r["case"], r["image"])
+        if "error" in r or key not in old:
+            continue
+        o = old[key]
+        notes = []
+        for field in ("compress_mbs", "decompress_mbs"):
+            change = r[field] / o[field] - 1
+            if change < -threshold:
+                notes.append("%s %.1f%%" % (field, 100 * change))
+        if r["ratio"] < o["ratio"] * (1 - 1e-9):
+            notes.append("ratio %.3f -> %.3f" % (o["ratio"], r["ratio"]))
+        if notes:
+            regressions += 1
+            print("REGRESSION\t%s\t%s\t%s" % (r["case"], r["image"], ", ".join(notes)))
+    print("Compared %d results with baseline: %d regressions" % (len(results), regressions))
+    return regressions
+
+
+def main(argv):
+    if len(argv) > 0 and argv[0] == "--stage":
+        run_stage(argv[1], argv[2], argv[3], argv[4:])
+        return
+
+    parser = argparse.ArgumentParser(description = "Benchmark every codec over sample images")
+    parser.add_argument("--cases", default = ",".join(cases), help = "comma separated cases (default: all)")
+    parser.add_argument("--images", nargs = "+", default = ["images/sample*.jpeg", "{codec}-coding/*.jpeg"],
+                        help = "glob patterns, relative to the repository, {codec} is the codec of a case")
+    parser.add_argument("--save", help = "save results as a JSON baseline")
+    parser.add_argument("--compare", help = "compare with a JSON baseline")
+    parser.add_argument("--threshold", type = float, default = 0.1, help = "slowdown counted as regression (default 0.1)")
+    parser.add_argument("--timeout", type = float, default = 0, help = "seconds for each stage, 0 for no limit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.cases.split(",") if name]
+    for name in names:
+        if name not in cases:
+            raise ValueError("Case must be one of %s" % ", ".join(cases))
+
+    print("case\timage\tratio\tcompress MB/s\tdecompress MB/s\tcompress RSS MB\tdecompress RSS MB\troundtrip")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            for image_path in case_images(name, args.images):
+                r = bench_case(name, image_path, workdir, args.timeout)
+                results.append(r)
+                if "error" in r:
+                    print("%s\t%s\t%s" % (name, r["image"], r["error"]))
+                else:
+                    print("%s\t%s\t%.3f\t%.2f\t%.2f\t%.1f\t%.1f\t%s" % (name, r["image"], r["ratio"],
+                          r["compress_mbs"], r["decompress_mbs"], r["compress_rss"] / 1e6,
+                          r["decompress_rss"] / 1e6, "OK" if r["roundtrip"] else "FAIL"))
+                sys.stdout.flush()
+
+    report = {
+        "time"     : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python"   : platform.python_version(),
+        "machine"  : platform.machine(),
+        "results"  : results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent = 1)
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    # exit status: 1 if a case failed, did not round trip or regressed
+    failed = [r for r in results if "error" in r or not r["roundtrip"]]
+    return 1 if failed or regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+
+# Shared container lives in ../common
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(_root, 'common'))
+from bitstream import bitInStream
+from container import container, read_header, read_info, coders, models, formats
+
+# - Codec parameters at the start of each model section:
+#   (name, number of bits, list naming the values, from ../common/container.py)
+params = {
+    "huffman"     : [("extended_size", 8, None)],
+    "arithmetic"  : [("coder", 8, coders), ("model", 8, models)],
+    "lzw"         : [("maxbits", 5, None)],
+    "lz77"        : [("level", 4, None)],
+    "runlength"   : [("format", 8, formats)],
+    "shannonfano" : [],
+    "ans"         : [("lanes", 5, None), ("scale", 5, None)],
+}
+
+# - Model section of a compressed file, of its first tile
+#   for a tiled file (every tile has the same parameters)
+def model_stream(path):
+    file = container(path, layout = None)
+    if file.layout != "YCrCb-tiled":
+        return file.model()
+    _, entries = file.tiles()
+    offset = entries[0][0]
+    header = read_header(file.tile(entries[0]), path)
+    start = 8 * (offset + header["model_offset"])
+    return bitInStream(file.data, start + header["model_numbits"], start)
+
+# - Metadata of a compressed file: header fields, tile index
+#   of a tiled file, then codec parameters read from the first bits
+#   of its model section
+def info(path, parameters = True):
+    result = read_info(path)
+    if result["layout"] == "YCrCb-tiled":
+        tile_shape, entries = container(path, layout = None).tiles()
+        result["tile_width"]  = tile_shape[1]
+        result["tile_height"] = tile_shape[0]
+        result["tiles"]       = len(entries)
+    if parameters:
+        bitin = model_stream(path)
+        for name, numbits, names in params[result["codec"]]:
+            value = bitin.read_bits(numbits)
+            if names is not None:
+                value = names[value]
+            elif name == "lanes":
+                value = 1 << value
+            result[name] = value
+    return result
+
+
+def main(argv):
+    # --header: only fields of the fixed header
+    parameters = "--header" not in argv
+    paths = [arg for arg in argv if arg != "--header"]
+    if len(paths) == 0:
+        print("Usage: python info.py [--header] compressed_file ...")
+        return
+
+    # one JSON object for each file
+    for path in paths:
+        result = info(path, parameters)
+        result["path"] = path
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,150 @@
+import os
+import sys
+import cv2
+import time
+import argparse
+import tempfile
+import importlib
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+# Codec ids and the tiled container live in ../common/container.py
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(_root, 'common'))
+from container import codecs, tiledWriter
+
+# - Tiled mode: the image is cut into tiles (or row strips), each tile
+#   is compressed by the compress script of a codec on its own, so
+#   lists, tables and bitstreams of a codec only ever hold one tile.
+#   Tiles are passed to the scripts as lossless .bmp files on a
+#   temporary directory, compressed tiles are appended to the output.
+#   Tiles are independent (each has its own model), so they are
+#   coded on a pool of processes, one tile on each worker at a time
+
+# - State of a worker, set by init_worker: compress / decompress
+#   module of the codec, and its own directory for tile files
+worker = {"module": None, "workdir": None}
+
+
+# compress / decompress module of a codec
+def load_module(codec, stage):
+    sys.path.insert(0, os.path.join(_root, codec + '-coding'))
+    return importlib.import_module(codec + '_' + stage)
+
+def init_worker(codec, stage, workdir):
+    worker["module"]  = load_module(codec, stage)
+    worker["workdir"] = os.path.join(workdir, str(os.getpid()))
+    os.makedirs(worker["workdir"], exist_ok = True)
+
+# - Run function on each item (tuple of arguments) on a pool of
+#   workers, results are given back in order of items. At most
+#   2 * workers items are in flight, so only a few tiles are held
+#   in memory. One worker runs on this process, without a pool
+def run_tiles(function, items, workers, initargs):
+    if workers == 1:
+        init_worker(*initargs)
+        for item in items:
+            yield function(*item)
+        return
+
+    with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = initargs) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.submit(function, *item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# - Tiles of an image of "shape" (rows, columns), row major:
+#   [(row, column, rows, columns)], tiles on the last row / column
+#   may be smaller
+def tile_grid(shape, tile_shape):
+    rows, cols = shape
+    tile_rows, tile_cols = tile_shape
+    grid = []
+    for r in range(0, rows, tile_rows):
+        for c in range(0, cols, tile_cols):
+            grid.append((r, c, min(tile_rows, rows - r), min(tile_cols, cols - c)))
+    return grid
+
+# - Tile shape from "N" (N x N), "RxC", or rows only for strips
+#   (columns 0 is the width of image)
+def parse_tile(tile, strip, shape):
+    rows, cols = shape
+    if strip is not None:
+        tile_rows, tile_cols = int(strip), cols
+    elif "x" in tile:
+        tile_rows, tile_cols = [int(x) for x in tile.split("x")]
+    else:
+        tile_rows = tile_cols = int(tile)
+    if tile_rows <= 0:
+        raise ValueError("Tile must have at least one row")
+    return (tile_rows, tile_cols if tile_cols > 0 else cols)
+
+
+# - Compress one tile (BGR array) on a worker,
+#   return bytes of its container
+def compress_tile(tile, options = ()):
+    tile_path    = os.path.join(worker["workdir"], "tile.bmp")
+    encoded_path = os.path.join(worker["workdir"], "tile.bin")
+    cv2.imwrite(tile_path, tile)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        worker["module"].main([tile_path, encoded_path] + list(options))
+    with open(encoded_path, 'rb') as f:
+        return f.read()
+
+
+def tiled_compress(codec, image_path, output_path, tile = "1024", strip = None, options = (), workers = None):
+    if codec not in codecs:
+        raise ValueError("Codec must be one of %s" % ", ".join(codecs))
+    t = time.time()
+    try:
+        image = cv2.imread(image_path)
+        w, h, c = image.shape
+    except:
+        raise Exception("Image Invalid")
+
+    tile_shape = parse_tile(tile, strip, (w, h))
+    grid = tile_grid((w, h), tile_shape)
+    workers = workers or os.cpu_count() or 1
+
+    # - Arguments are checked above, before the output is opened,
+    #   a tile failing to compress leaves no partial file
+    writer = tiledWriter(output_path, codec, (w, h), tile_shape, len(grid))
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            items = ((image[r: r + rows, c: c + cols], options) for r, c, rows, cols in grid)
+            for i, data in enumerate(run_tiles(compress_tile, items, workers, (codec, "compress", workdir))):
+                sys.stdout.write("Processing:\ttile {}/{}\r".format(i + 1, len(grid)))
+                sys.stdout.flush()
+                writer.add(data)
+        print('')
+        size = writer.close()
+    except:
+        writer.discard()
+        raise
+
+    numbits_input  = w * h * 3 * 8
+    numbits_output = 8 * size
+    ratio = numbits_input * 1.0 / numbits_output
+    print("Input: \'%s\'\tOutput: \'%s\'\tTiles: %d\tBit Input: %d\tBit Output: %d\tRatio: %.2f\tTime: %.2f" %(image_path, output_path, len(grid), numbits_input, numbits_output, ratio, time.time() - t))
+    return {"tiles": len(grid), "numbits_input": numbits_input, "numbits_output": numbits_output, "ratio": ratio}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Compress an image tile by tile with any codec")
+    parser.add_argument("codec", choices = codecs)
+    parser.add_argument("image")
+    parser.add_argument("output_path")
+    parser.add_argument("-t", "--tile", default = "1024", help = "tile size, N or ROWSxCOLUMNS (default 1024)")
+    parser.add_argument("-s", "--strip", type = int, default = None, help = "row strips of this many rows, instead of tiles")
+    parser.add_argument("-j", "--workers", type = int, default = None, help = "number of processes (default: number of cores)")
+    parser.add_argument("options", nargs = "*", help = "options of the codec, as on its compress script")
+    args = parser.parse_intermixed_args(argv)
+
+    return tiled_compress(args.codec, args.image, args.output_path, args.tile, args.strip, args.options, args.workers)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
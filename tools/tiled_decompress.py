@@ -0,0 +1,66 @@
+import os
+import sys
+import cv2
+import time
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+
+# Tiled container lives in ../common/container.py
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.join(_root, 'common'))
+from container import container
+from tiled_compress import worker, run_tiles, tile_grid
+
+# - Decompress one tile (bytes of its container) on a worker,
+#   return the tile as a BGR array
+def decompress_tile(data):
+    encoded_path = os.path.join(worker["workdir"], "tile.bin")
+    tile_path    = os.path.join(worker["workdir"], "tile.bmp")
+    with open(encoded_path, 'wb') as f:
+        f.write(data)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        worker["module"].main([encoded_path, tile_path])
+    return cv2.imread(tile_path)
+
+
+# - Decode tiles on a pool of workers, each tile is found
+#   by its offset on the tile index, then copied into the output image
+def tiled_decompress(input_path, output_path, workers = None):
+    t = time.time()
+    file = container(input_path, layout = "YCrCb-tiled")
+    w, h = file.shape
+    tile_shape, entries = file.tiles()
+    grid = tile_grid((w, h), tile_shape)
+    if len(grid) != len(entries):
+        raise ValueError("Tile index does not match shape of image")
+    workers = workers or os.cpu_count() or 1
+
+    image = np.zeros((w, h, 3), dtype = np.uint8)
+    with tempfile.TemporaryDirectory() as workdir:
+        items = ((file.tile(entry),) for entry in entries)
+        tiles = run_tiles(decompress_tile, items, workers, (file.codec, "decompress", workdir))
+        for i, tile in enumerate(tiles):
+            r, c, rows, cols = grid[i]
+            sys.stdout.write("Processing:\ttile {}/{}\r".format(i + 1, len(grid)))
+            sys.stdout.flush()
+            image[r: r + rows, c: c + cols] = tile
+    print('')
+
+    cv2.imwrite(output_path, image)
+    print("Input: \'%s\' \tOutput: \'%s\' \tTiles: %d \tTime: %.2f(s)"%(input_path, output_path, len(grid), time.time() - t))
+    return image
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Decompress a tiled file")
+    parser.add_argument("input")
+    parser.add_argument("image_output")
+    parser.add_argument("-j", "--workers", type = int, default = None, help = "number of processes (default: number of cores)")
+    args = parser.parse_args(argv)
+
+    tiled_decompress(args.input, args.image_output, args.workers)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])